@@ -8,8 +8,11 @@ from config import config
 from routes.auth_routes import auth_bp
 from routes.document_routes import document_bp
 from routes.admin_routes import admin_bp
+from routes.file_routes import file_bp
 from flask_jwt_extended import JWTManager
 from worker import celery # <-- Import from new 'worker.py'
+from commands import register_commands
+from services.json_provider import init_json_provider
 
 def create_app(config_name=None):
     """Application factory pattern"""
@@ -21,13 +24,16 @@ def create_app(config_name=None):
     # Load configuration
     app.config.from_object(config[config_name])
 
+    # JSON encoding of responses (orjson when installed)
+    init_json_provider(app)
+
 
     # Configure CORS
     CORS(app, 
          resources={r"/api/*": {"origins": app.config['CORS_ORIGINS']}}, 
          supports_credentials=True, 
          expose_headers=["Authorization"], 
-         allow_headers=["Content-Type", "Authorization"]
+         allow_headers=["Content-Type", "Authorization", "Idempotency-Key"]
     )
 
     # --- NEW CELERY CONFIG ---
@@ -36,7 +42,8 @@ def create_app(config_name=None):
         broker_url=app.config['CELERY_BROKER_URL'],
         result_backend=app.config['CELERY_RESULT_BACKEND'],
         document_force_execv=True,  # Critical for Windows compatibility
-        worker_pool='solo'  # Use solo pool on Windows instead of prefork
+        worker_pool=app.config['CELERY_WORKER_POOL'],  # 'threads' by default, 'solo' on Windows
+        worker_concurrency=app.config['CELERY_WORKER_CONCURRENCY']
     )
     # Add Flask app context to all Celery documents
     class ContextTask(celery.Task):
@@ -155,6 +162,10 @@ def create_app(config_name=None):
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(document_bp, url_prefix='/api/documents')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(file_bp, url_prefix='/api/files')
+
+    # Register CLI commands (flask reextract, ...)
+    register_commands(app)
     
     # Health check route
     @app.route('/')
@@ -0,0 +1,120 @@
+# backend/benchmarks/list_documents.py
+"""
+Rows per second of the document listing read path: MongoEngine Documents
+(the old path) against raw pymongo rows from list_queryset (as_pymongo()),
+for the full and summary views, with and without JSON encoding.
+Documents are seeded into a scratch collection (documents_benchmark) of the
+configured database and dropped afterwards (--keep to reuse them).
+Usage (from the backend folder): python -m benchmarks.list_documents --rows 5000 --repeat 5
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from mongoengine.context_managers import switch_collection
+from app import app
+from models.document import Document
+from controllers.document_controller import (
+    document_to_json, document_to_summary_json, list_queryset, summary_only
+)
+
+COLLECTION = 'documents_benchmark'
+
+SAMPLE_DATA = {
+    'card_number': 'AB123456', 'last_name_fr': 'EL AMRANI', 'last_name_ar': 'العمراني',
+    'first_name_fr': 'YOUSSEF', 'first_name_ar': 'يوسف', 'birth_date': '12/03/1990',
+    'birth_place_fr': 'CASABLANCA', 'birth_place_ar': 'الدار البيضاء', 'expiry_date': '11/03/2030',
+    'address_fr': '12 RUE DES ORANGERS CASABLANCA', 'address_ar': '12 زنقة البرتقال الدار البيضاء',
+    'father_name_fr': 'MOHAMED', 'father_name_ar': 'محمد', 'mother_name_fr': 'FATIMA', 'mother_name_ar': 'فاطمة',
+}
+
+
+def seed(collection, rows):
+    """Inserts `rows` completed documents shaped like real ones"""
+    now = datetime.utcnow()
+    users = [ObjectId() for _ in range(20)]
+    batch = []
+    for index in range(rows):
+        created_at = now - timedelta(seconds=index)
+        batch.append({
+            'document_type': 'cin',
+            'image_path_recto': f'https://res.cloudinary.com/demo/image/upload/v1/documents/{index}_recto.jpg',
+            'image_path_verso': f'https://res.cloudinary.com/demo/image/upload/v1/documents/{index}_verso.jpg',
+            'image_hash_recto': f'{random.getrandbits(256):064x}',
+            'image_hash_verso': f'{random.getrandbits(256):064x}',
+            'original_size_recto': 2400000, 'stored_size_recto': 310000,
+            'original_size_verso': 2300000, 'stored_size_verso': 290000,
+            'user': random.choice(users),
+            'status': 'completed',
+            'extracted_data': dict(SAMPLE_DATA),
+            'error_messages': [],
+            'original_filename': f'scan_{index}.jpg',
+            'created_at': created_at, 'updated_at': created_at, 'completed_at': created_at,
+        })
+        if len(batch) == 1000:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+
+
+def measure(label, read, serialize, rows, repeat, encode):
+    """Best of `repeat` runs, in rows per second"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        documents = [serialize(document) for document in read().order_by('-created_at').limit(rows)]
+        if encode:
+            app.json.dumps({'documents': documents})
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    rate = len(documents) / best if best else 0.0
+    print(f"  {label:<34} {rate:>12,.0f} rows/s  ({best * 1000:.1f} ms for {len(documents)} rows)")
+    return rate
+
+
+def run(rows, repeat, keep=False):
+    with app.app_context(), switch_collection(Document, COLLECTION) as BenchmarkDocument:
+        collection = BenchmarkDocument._get_collection()
+        existing = collection.estimated_document_count()
+        if existing < rows:
+            print(f"🌱 Seeding {rows - existing} documents into {COLLECTION}...")
+            seed(collection, rows - existing)
+
+        paths = {
+            'full': (
+                lambda: BenchmarkDocument.objects(),
+                lambda: list_queryset(BenchmarkDocument.objects(), 'full'),
+                document_to_json,
+            ),
+            'summary': (
+                lambda: summary_only(BenchmarkDocument.objects()),
+                lambda: list_queryset(BenchmarkDocument.objects(), 'summary'),
+                document_to_summary_json,
+            ),
+        }
+        app.config['RAW_READS_ENABLED'] = True
+        for encode in (False, True):
+            print(f"\n📊 {rows} rows, best of {repeat}{' (with JSON encoding)' if encode else ''}")
+            for view, (objects_read, raw_read, serialize) in paths.items():
+                before = measure(f"{view}: MongoEngine documents", objects_read, serialize, rows, repeat, encode)
+                after = measure(f"{view}: raw rows (as_pymongo)", raw_read, serialize, rows, repeat, encode)
+                print(f"  {view}: x{after / before:.1f}" if before else '')
+
+        if not keep:
+            collection.drop()
+            print(f"\n🧹 Dropped {COLLECTION}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000, help='rows read per run')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per path (the best one is reported)')
+    parser.add_argument('--keep', action='store_true', help=f'keep the {COLLECTION} collection')
+    args = parser.parse_args()
+    run(args.rows, args.repeat, keep=args.keep)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# backend/commands.py
+"""
+Flask CLI commands.
+Usage (from the backend folder): flask --app app reextract --status failed --date-from 2024-01-01
+"""
+import click
+from services.reextraction import normalize_filters, create_job, run_job
+from services.stats_service import rebuild_materialized_stats
+
+
+def register_commands(app):
+    """Registers the custom CLI commands on the Flask app"""
+
+    @app.cli.command('reextract')
+    @click.option('--document-type', default=None, help='Comma-separated types (cin, driving_license, vehicle_registration)')
+    @click.option('--status', default=None, help='Comma-separated statuses (default: completed,failed)')
+    @click.option('--date-from', default=None, help='Only documents created on/after this ISO date')
+    @click.option('--date-to', default=None, help='Only documents created on/before this ISO date')
+    @click.option('--chunk-size', default=500, show_default=True, help='Documents enqueued per chunk')
+    @click.option('--rate', default=20.0, show_default=True, help='Max documents enqueued per second (0 = unlimited)')
+    @click.option('--resume', 'resume_job_id', default=None, help='Resume an existing job from its checkpoint')
+    def reextract(document_type, status, date_from, date_to, chunk_size, rate, resume_job_id):
+        """Re-run AI extraction for every document matching the filters."""
+        if resume_job_id:
+            job_id = resume_job_id
+            click.echo(f"🔁 Resuming re-extraction job {job_id}")
+        else:
+            try:
+                filters = normalize_filters({
+                    'document_type': document_type,
+                    'status': status,
+                    'date_from': date_from,
+                    'date_to': date_to
+                })
+            except ValueError as e:
+                raise click.BadParameter(str(e))
+
+            job = create_job(filters, chunk_size=chunk_size, rate_limit=rate)
+            job_id = str(job.id)
+            click.echo(f"🔁 Created re-extraction job {job_id}: {job.total} matching documents")
+
+        job = run_job(job_id)
+        click.echo(f"Job {job_id}: {job.status}, {job.enqueued}/{job.total} enqueued")
+
+    @app.cli.command('rebuild-stats')
+    def rebuild_stats():
+        """Recompute the materialized admin dashboard counters."""
+        stats = rebuild_materialized_stats()
+        click.echo(f"📊 Rebuilt document stats: {stats['total']} documents")
+        click.echo(f"   By type: {stats['by_type']}")
+        click.echo(f"   By status: {stats['by_status']}")
@@ -16,14 +16,76 @@ class Config:
     CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME')
     CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
     CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET')
+    CLOUDINARY_UPLOAD_WORKERS = int(os.environ.get('CLOUDINARY_UPLOAD_WORKERS', 8))  # shared upload threads per process
+    CLOUDINARY_UPLOAD_TIMEOUT = float(os.environ.get('CLOUDINARY_UPLOAD_TIMEOUT', 60.0))  # seconds per file
 
     # --- OpenAI settings ---
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL', 'https://models.github.ai/inference')
     OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'openai/gpt-4.1')
+    # Connection pool / timeouts for the per-process OpenAI client
+    # At least EXTRACTION_MAX_IN_FLIGHT, or requests queue for a connection
+    OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 40))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10))
+    OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', 60.0))
+    OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 10.0))
+    OPENAI_REQUEST_TIMEOUT = float(os.environ.get('OPENAI_REQUEST_TIMEOUT', 120.0))  # 2 minutes for large images
+    # SDK-level retries; services/resilience.py already retries transient errors
+    OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 0))
+
+    # --- Model call resilience settings (retries, hedging, circuit breaker) ---
+    MODEL_RETRY_MAX_ATTEMPTS = int(os.environ.get('MODEL_RETRY_MAX_ATTEMPTS', 3))
+    MODEL_RETRY_BASE_DELAY = float(os.environ.get('MODEL_RETRY_BASE_DELAY', 1.0))
+    MODEL_RETRY_MAX_DELAY = float(os.environ.get('MODEL_RETRY_MAX_DELAY', 20.0))
+    MODEL_HEDGE_ENABLED = os.environ.get('MODEL_HEDGE_ENABLED', 'True').lower() == 'true'
+    MODEL_HEDGE_PERCENTILE = int(os.environ.get('MODEL_HEDGE_PERCENTILE', 95))  # hedge after this latency percentile
+    MODEL_HEDGE_MIN_DELAY = float(os.environ.get('MODEL_HEDGE_MIN_DELAY', 5.0))
+    MODEL_HEDGE_AFTER = float(os.environ.get('MODEL_HEDGE_AFTER', 30.0))  # until enough latencies are known
+    # Threads per process running hedged calls (first attempt + hedge); 0 = 2 x CELERY_WORKER_CONCURRENCY
+    MODEL_HEDGE_POOL_SIZE = int(os.environ.get('MODEL_HEDGE_POOL_SIZE', 0))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+    CIRCUIT_FAILURE_WINDOW = int(os.environ.get('CIRCUIT_FAILURE_WINDOW', 60))  # seconds
+    CIRCUIT_COOLDOWN = int(os.environ.get('CIRCUIT_COOLDOWN', 30))  # seconds the queue is paused
+    CIRCUIT_PROBE_LEASE = int(os.environ.get('CIRCUIT_PROBE_LEASE', 60))  # seconds, half-open: one probe call at a time
+    CIRCUIT_MAX_DEFERRALS = int(os.environ.get('CIRCUIT_MAX_DEFERRALS', 100))  # per document
+
+    # --- Model router settings ---
+    # JSON list of endpoints, e.g. [{"name": "gh-mini", "base_url": "...", "api_key_env": "GITHUB_TOKEN",
+    #   "model": "openai/gpt-4.1-mini", "cost": 0.2, "accuracy": {"default": 0.9, "passport": 0.8},
+    #   "weight": 1, "max_concurrency": 10, "rpm": 60, "tpm": 100000}, ...]; empty = the single OPENAI_* endpoint.
+    #   Endpoints sharing one provider quota (same API key) set the same "bucket" name for their rpm/tpm
+    MODEL_ENDPOINTS = os.environ.get('MODEL_ENDPOINTS', '')
+    # JSON object per document type (or "default"): {"prefer": "cost"|"latency"|"weighted", "min_accuracy": 0.9}
+    MODEL_ROUTING = os.environ.get('MODEL_ROUTING', '{}')
+    MODEL_ROUTER_WAIT_TIMEOUT = float(os.environ.get('MODEL_ROUTER_WAIT_TIMEOUT', 30.0))  # seconds, when all endpoints are saturated
+
+    # --- Model rate limit settings (Redis token buckets shared by every worker) ---
+    # Budgets of the OPENAI_* endpoint, shared with the cascade fast model (MODEL_ENDPOINTS
+    # entries set "rpm"/"tpm"); 0 = unlimited
+    RATE_LIMIT_RPM = int(os.environ.get('RATE_LIMIT_RPM', 0))
+    RATE_LIMIT_TPM = int(os.environ.get('RATE_LIMIT_TPM', 0))
+    RATE_LIMIT_BASE_TOKENS = int(os.environ.get('RATE_LIMIT_BASE_TOKENS', 1500))  # prompt + answer estimate
+    RATE_LIMIT_TOKENS_PER_IMAGE = int(os.environ.get('RATE_LIMIT_TOKENS_PER_IMAGE', 1000))
+
+    # --- Cascade extraction settings (fast model first, large model on failed checks) ---
+    CASCADE_ENABLED = os.environ.get('CASCADE_ENABLED', 'False').lower() == 'true'
+    # Fast tier used without MODEL_ENDPOINTS (with it, endpoints declare "tier": "fast" | "large")
+    CASCADE_FAST_MODEL = os.environ.get('CASCADE_FAST_MODEL', 'openai/gpt-4.1-mini')
+    CASCADE_MIN_SCORE = float(os.environ.get('CASCADE_MIN_SCORE', 0.9))  # share of passed checks to keep the fast answer
 
     # File Upload settings
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.abspath(os.path.dirname(__file__)), 'uploads')
+    # 'sync' uploads to Cloudinary inside the request; 'staged' spools to disk,
+    # answers 202 and lets a worker push the files (the spool must be shared)
+    UPLOAD_MODE = os.environ.get('UPLOAD_MODE', 'sync')
+    UPLOAD_SPOOL_FOLDER = os.environ.get('UPLOAD_SPOOL_FOLDER') or os.path.join(UPLOAD_FOLDER, 'spool')
+    # 'cloudinary', or 'local' (content-addressed files served by GET /api/files/<key>)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'cloudinary')
+    STORAGE_LOCAL_ROOT = os.environ.get('STORAGE_LOCAL_ROOT') or os.path.join(UPLOAD_FOLDER, 'objects')
+    # Base of the URLs stored on documents; must be reachable by the model provider unless inline mode is on
+    STORAGE_PUBLIC_BASE_URL = os.environ.get('STORAGE_PUBLIC_BASE_URL', 'http://localhost:5000')
+    # GET /api/files/<key> only serves signed URLs (handed out in API responses and to the model)
+    STORAGE_SIGNED_URL_TTL = int(os.environ.get('STORAGE_SIGNED_URL_TTL', 3600))  # seconds
     # Accept all common image formats
     ALLOWED_EXTENSIONS = {
         'png', 'jpg', 'jpeg', 'jpe', 'jfif',  # JPEG variants
@@ -31,6 +93,24 @@ class Config:
         'svg', 'ico', 'heic', 'heif',         # Additional formats
         'avif', 'jp2', 'j2k', 'jpx'           # Modern formats
     }
+
+    # --- Image normalization settings (needs Pillow, pillow-heif for HEIC) ---
+    # Staged uploads only: it runs on the workers, sync uploads keep the original bytes
+    IMAGE_NORMALIZE_ENABLED = os.environ.get('IMAGE_NORMALIZE_ENABLED', 'True').lower() == 'true'
+    IMAGE_MAX_EDGE = int(os.environ.get('IMAGE_MAX_EDGE', 2048))  # pixels, longest side
+    IMAGE_OUTPUT_FORMAT = os.environ.get('IMAGE_OUTPUT_FORMAT', 'JPEG')  # JPEG or WEBP
+    IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 85))
+    IMAGE_CROP_ENABLED = os.environ.get('IMAGE_CROP_ENABLED', 'True').lower() == 'true'
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 50_000_000))  # decompression bomb guard
+
+    # --- Model image payload settings ---
+    # 'url' lets the provider fetch the Cloudinary URL; 'inline' sends the kept bytes as data URIs
+    EXTRACTION_IMAGE_MODE = os.environ.get('EXTRACTION_IMAGE_MODE', 'url')
+    INLINE_IMAGE_MAX_BYTES = int(os.environ.get('INLINE_IMAGE_MAX_BYTES', 4 * 1024 * 1024))  # larger images go by URL
+    INLINE_IMAGE_CACHE_TTL = int(os.environ.get('INLINE_IMAGE_CACHE_TTL', 3600))
+    # Dedicated Redis for the kept bytes (maxmemory + allkeys-lru), never the Celery broker;
+    # unset: only the local storage backend can inline
+    INLINE_IMAGE_REDIS_URL = os.environ.get('INLINE_IMAGE_REDIS_URL')
     # Maximum file size for uploads (20MB)
     MAX_CONTENT_LENGTH = 20 * 1024 * 1024  # 20MB in bytes
     
@@ -47,12 +127,69 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES', 3600))  # 1 hour
     
     
+    # Server-Sent Events for document status (seconds)
+    # Full streams on the eventlet events server; a long-poll on threaded servers
+    STATUS_STREAM_TIMEOUT = int(os.environ.get('STATUS_STREAM_TIMEOUT', 60))
+    STATUS_STREAM_HEARTBEAT = int(os.environ.get('STATUS_STREAM_HEARTBEAT', 15))
+    STATUS_LONG_POLL_TIMEOUT = int(os.environ.get('STATUS_LONG_POLL_TIMEOUT', 10))
+    
+    # Admin stats: read counters from the materialized `stats` collection
+    ADMIN_STATS_MATERIALIZED = os.environ.get('ADMIN_STATS_MATERIALIZED', 'False').lower() == 'true'
+    
     # CORS settings
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*').split(',')
 
     #--- Celery (Redis Broker) settings (Still needed!) ---
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
+    # 'threads' runs CELERY_WORKER_CONCURRENCY documents per process (each one
+    # mostly waits on the model); 'solo' keeps Windows compatibility
+    CELERY_WORKER_POOL = os.environ.get('CELERY_WORKER_POOL', 'solo' if os.name == 'nt' else 'threads')
+    CELERY_WORKER_CONCURRENCY = int(os.environ.get('CELERY_WORKER_CONCURRENCY', 1 if os.name == 'nt' else 32))
+
+    # --- Extraction concurrency settings (per worker process) ---
+    # Model requests in flight, hedges included; a call waits up to
+    # MODEL_ROUTER_WAIT_TIMEOUT for a slot, then the document is deferred
+    EXTRACTION_MAX_IN_FLIGHT = int(os.environ.get('EXTRACTION_MAX_IN_FLIGHT', 40))
+    # Deadline of one document's model calls (attempts, failover, cascade): each
+    # request's timeout is cut to the time left, so nothing outlives it
+    EXTRACTION_CALL_TIMEOUT = float(os.environ.get('EXTRACTION_CALL_TIMEOUT', 150.0))  # seconds
+
+    # --- Extraction queue settings (interactive / bulk lanes, per-user fair share) ---
+    EXTRACTION_INTERACTIVE_BURST = int(os.environ.get('EXTRACTION_INTERACTIVE_BURST', 5))  # uploads per user and window
+    EXTRACTION_INTERACTIVE_WINDOW = int(os.environ.get('EXTRACTION_INTERACTIVE_WINDOW', 60))  # seconds
+    EXTRACTION_BULK_MAX_IN_FLIGHT = int(os.environ.get('EXTRACTION_BULK_MAX_IN_FLIGHT', 32))  # bulk documents in Celery
+    EXTRACTION_BULK_SLOT_TIMEOUT = int(os.environ.get('EXTRACTION_BULK_SLOT_TIMEOUT', 900))  # seconds, lost workers
+
+    # --- Bulk re-extraction settings ---
+    # A running job that has not checkpointed for this long (and at least three
+    # batch intervals) is considered dead and may be resumed
+    REEXTRACTION_STALE_AFTER = int(os.environ.get('REEXTRACTION_STALE_AFTER', 300))  # seconds
+
+    # --- Duplicate suppression settings ---
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 3600))  # seconds an Idempotency-Key is remembered
+    EXTRACTION_LOCK_LEASE = float(os.environ.get('EXTRACTION_LOCK_LEASE', 60.0))  # seconds, renewed while the task runs
+
+    # --- API response settings ---
+    FAST_JSON_ENABLED = os.environ.get('FAST_JSON_ENABLED', 'True').lower() == 'true'  # orjson encoder, if installed
+    RAW_READS_ENABLED = os.environ.get('RAW_READS_ENABLED', 'True').lower() == 'true'  # listings read pymongo dicts
+
+    # --- Redis settings (cache, metrics) - defaults to the Celery broker ---
+    REDIS_URL = os.environ.get('REDIS_URL') or CELERY_BROKER_URL
+    REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 5.0))
+    METRICS_GAUGE_TTL = int(os.environ.get('METRICS_GAUGE_TTL', 120))
+
+    # --- Extraction cache settings ---
+    EXTRACTION_CACHE_ENABLED = os.environ.get('EXTRACTION_CACHE_ENABLED', 'True').lower() == 'true'
+    EXTRACTION_CACHE_TTL = int(os.environ.get('EXTRACTION_CACHE_TTL', 30 * 24 * 3600))  # 30 days
+    EXTRACTION_CACHE_MAX_ENTRIES = int(os.environ.get('EXTRACTION_CACHE_MAX_ENTRIES', 50000))
+
+    # --- Auth user cache settings ---
+    USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', 'True').lower() == 'true'
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))  # seconds, in-process tier
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10000))
+    USER_CACHE_REDIS_ENABLED = os.environ.get('USER_CACHE_REDIS_ENABLED', 'False').lower() == 'true'
+    USER_CACHE_REDIS_TTL = int(os.environ.get('USER_CACHE_REDIS_TTL', 300))
 
 class DevelopmentConfig(Config):
     """Development configuration."""
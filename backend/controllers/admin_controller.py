@@ -1,43 +1,63 @@
 # backend/controllers/admin_controller.py
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from models.document import Document
 from models.user import User
-from controllers.document_controller import document_to_json
+from models.reextraction_job import ReextractionJob
+from controllers.document_controller import (
+    document_fields, document_to_json, document_to_summary_json, cursor_page_response, get_list_view, list_queryset, LIST_VIEWS
+)
+from services.pagination import COUNT_MODES, count_documents
+from services.extraction_cache import get_cache_stats, invalidate_extraction_cache
+from services.extraction_quality import get_cascade_stats
+from services.extraction_queue import get_queue_stats
+from services import metrics
+from services.reextraction import normalize_filters, create_job, start_run, is_stale
+from services.stats_service import get_document_stats
+from task import run_reextraction_job
 from datetime import datetime
 
 def get_admin_stats():
     """Get admin dashboard statistics"""
     try:
-        total_users = User.objects().count()
-        total_documents = Document.objects().count()
+        # O(1) collection metadata instead of a full count
+        total_users = User._get_collection().estimated_document_count()
         
-        # Documents by type
-        documents_by_type = {}
-        for doc_type in ['cin', 'driving_license', 'vehicle_registration']:
-            count = Document.objects(document_type=doc_type).count()
-            documents_by_type[doc_type] = count
-        
-        # Documents by status
-        documents_by_status = {}
-        for status in ['pending', 'processing', 'completed', 'failed', 'confirmed']:
-            count = Document.objects(status=status).count()
-            documents_by_status[status] = count
+        # Documents by type / status: one $facet aggregation, or the
+        # materialized counters when ADMIN_STATS_MATERIALIZED is enabled
+        document_stats = get_document_stats()
         
         # Recent documents (last 10)
-        recent_documents = Document.objects().order_by('-created_at').limit(10)
+        recent_documents = list_queryset(Document.objects()).order_by('-created_at').limit(10)
         recent_docs_list = [document_to_json(doc) for doc in recent_documents]
         
         return jsonify({
             'total_users': total_users,
-            'total_documents': total_documents,
-            'documents_by_type': documents_by_type,
-            'documents_by_status': documents_by_status,
+            'total_documents': document_stats['total'],
+            'documents_by_type': document_stats['by_type'],
+            'documents_by_status': document_stats['by_status'],
             'recent_documents': recent_docs_list
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def document_owner_id(document):
+    """User id of a Document or of a raw pymongo document"""
+    if isinstance(document, dict):
+        return document.get('user')
+    return document.user.id if document.user else None
+
+def load_users_by_id(documents) -> dict:
+    """Batch-load the (id, name, email) of the users owning the given documents"""
+    user_ids = {document_owner_id(doc) for doc in documents} - {None}
+    if not user_ids:
+        return {}
+    users = User.objects(id__in=list(user_ids)).only('name', 'email').as_pymongo()
+    return {
+        user['_id']: {'id': str(user['_id']), 'name': user.get('name'), 'email': user.get('email')}
+        for user in users
+    }
+
 def get_all_documents():
     """Get all documents with pagination and filters (admin only)"""
     try:
@@ -55,54 +75,42 @@ def get_all_documents():
             query['status'] = status
         if user_id:
             query['user'] = user_id
+
+        view = get_list_view()
+        if not view:
+            return jsonify({'error': f'Invalid view. Must be one of: {", ".join(LIST_VIEWS)}'}), 400
+        queryset = list_queryset(Document.objects(**query), view)
+        summary = view == 'summary'
+        
+        if request.args.get('pagination', 'offset') == 'cursor':
+            return cursor_page_response(
+                queryset.no_dereference(), per_page,
+                filtered=bool(query), serialize=lambda docs: serialize_admin_documents(docs, summary=summary)
+            )
+        
+        count_mode = request.args.get('count', 'exact')
+        if count_mode not in COUNT_MODES:
+            return jsonify({'error': f'Invalid count. Must be one of: {", ".join(COUNT_MODES)}'}), 400
         
         # Get paginated documents manually
         skip = (page - 1) * per_page
         
-        if query:
-            documents_query = Document.objects(**query).order_by('-created_at')
-        else:
-            documents_query = Document.objects().order_by('-created_at')
+        documents_query = queryset.order_by('-created_at')
         
         # Get total count
-        total = documents_query.count()
+        total, _ = count_documents(documents_query, count_mode, filtered=bool(query))
         
-        # Get paginated items
-        documents = documents_query.skip(skip).limit(per_page)
+        # Get paginated items (no_dereference: doc.user stays a DBRef, no per-row query)
+        documents = list(documents_query.skip(skip).limit(per_page).no_dereference())
         
         # Calculate total pages
-        total_pages = (total + per_page - 1) // per_page if per_page > 0 else 1
-        
-        # Get user info for each document
-        documents_list = []
-        for doc in documents:
-            try:
-                doc_dict = document_to_json(doc)
-                # Add user info
-                try:
-                    if hasattr(doc.user, 'id'):
-                        user = User.objects(id=doc.user.id).first()
-                        if user:
-                            doc_dict['user'] = {
-                                'id': str(user.id),
-                                'name': user.name,
-                                'email': user.email
-                            }
-                        else:
-                            doc_dict['user'] = None
-                    else:
-                        doc_dict['user'] = None
-                except Exception as user_error:
-                    print(f"Error getting user for document {doc.id}: {user_error}")
-                    doc_dict['user'] = None
-                
-                documents_list.append(doc_dict)
-            except Exception as doc_error:
-                print(f"Error serializing document {doc.id}: {doc_error}")
-                continue
+        if total is None:
+            total_pages = None
+        else:
+            total_pages = (total + per_page - 1) // per_page if per_page > 0 else 1
         
         return jsonify({
-            'documents': documents_list,
+            'documents': serialize_admin_documents(documents, summary=summary),
             'total': total,
             'page': page,
             'per_page': per_page,
@@ -114,6 +122,22 @@ def get_all_documents():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def serialize_admin_documents(documents, summary=False) -> list:
+    """Serialize a page of documents with their owner (one batched user query)"""
+    # Load the users of the whole page with one $in query
+    users_by_id = load_users_by_id(documents)
+    
+    documents_list = []
+    for doc in documents:
+        try:
+            doc_dict = document_to_summary_json(doc) if summary else document_to_json(doc)
+            doc_dict['user'] = users_by_id.get(document_owner_id(doc))
+            documents_list.append(doc_dict)
+        except Exception as doc_error:
+            print(f"Error serializing document {document_fields(doc)[1]}: {doc_error}")
+            continue
+    return documents_list
+
 def get_admin_document(document_id):
     """Get a specific document by ID (admin only)"""
     try:
@@ -187,23 +211,169 @@ def delete_admin_document(document_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+USER_LIST_FIELDS = ('username', 'email', 'name', 'role', 'is_active', 'created_at')
+
 def get_all_users():
     """Get all users (admin only)"""
     try:
-        users = User.objects().order_by('-created_at')
+        # Raw rows without the password hashes (datetimes are encoded by the JSON provider)
+        users = User.objects().only(*USER_LIST_FIELDS).order_by('-created_at').as_pymongo()
         users_list = []
         for user in users:
             users_list.append({
-                'id': str(user.id),
-                'username': user.username,
-                'email': user.email,
-                'name': user.name,
-                'role': user.role,
-                'is_active': user.is_active,
-                'created_at': user.created_at.isoformat()
+                'id': str(user['_id']),
+                'username': user.get('username'),
+                'email': user.get('email'),
+                'name': user.get('name'),
+                'role': user.get('role', 'user'),
+                'is_active': user.get('is_active', True),
+                'created_at': user.get('created_at')
             })
         
         return jsonify({'users': users_list}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+def get_extraction_cache_stats():
+    """Get extraction cache hit/miss counters (admin only)"""
+    try:
+        return jsonify(get_cache_stats()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def clear_extraction_cache():
+    """Invalidate every cached extraction, e.g. after a prompt change (admin only)"""
+    try:
+        removed = invalidate_extraction_cache()
+        return jsonify({
+            'message': 'Extraction cache cleared successfully',
+            'removed': removed
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def get_metrics():
+    """Get shared counters and live per-process gauges, e.g. OpenAI pool usage (admin only)"""
+    try:
+        return jsonify(metrics.snapshot()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def get_cascade_escalations():
+    """Get the cascade escalation rate per document type (admin only)"""
+    try:
+        return jsonify({
+            'enabled': current_app.config.get('CASCADE_ENABLED', False),
+            'document_types': get_cascade_stats()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def get_extraction_queues():
+    """Get the bulk backlog per tenant and lane counters (admin only)"""
+    try:
+        return jsonify(get_queue_stats()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def reextraction_job_to_json(job: ReextractionJob) -> dict:
+    """Helper function to serialize a re-extraction job with its progress"""
+    throughput = job.throughput()
+    eta = job.eta_seconds()
+    return {
+        'id': str(job.id),
+        'status': job.status,
+        'filters': job.filters,
+        'chunk_size': job.chunk_size,
+        'rate_limit': job.rate_limit,
+        'total': job.total,
+        'enqueued': job.enqueued,
+        'progress': round(job.enqueued / job.total, 4) if job.total else None,
+        'throughput': round(throughput, 2) if throughput else None,
+        'eta_seconds': round(eta) if eta is not None else None,
+        'last_document_id': job.last_document_id,
+        'error_message': job.error_message,
+        'created_at': job.created_at.isoformat(),
+        'updated_at': job.updated_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+def start_reextraction():
+    """Start a bulk re-extraction job for the documents matching the filters (admin only)"""
+    try:
+        data = request.get_json() or {}
+
+        try:
+            filters = normalize_filters(data)
+            chunk_size = int(data.get('chunk_size', 500))
+            rate_limit = float(data.get('rate_limit', 20.0))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if chunk_size < 1 or rate_limit < 0:
+            return jsonify({'error': 'chunk_size must be >= 1 and rate_limit >= 0'}), 400
+
+        job = create_job(filters, chunk_size=chunk_size, rate_limit=rate_limit,
+                         created_by=request.current_user.id)
+        job = start_run(job.id)
+        run_reextraction_job.delay(str(job.id), job.run_token)
+
+        return jsonify(reextraction_job_to_json(job)), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def get_reextraction_jobs():
+    """List bulk re-extraction jobs, most recent first (admin only)"""
+    try:
+        jobs = ReextractionJob.objects().order_by('-created_at').limit(50)
+        return jsonify({'jobs': [reextraction_job_to_json(job) for job in jobs]}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def get_reextraction_job(job_id):
+    """Get progress, throughput and ETA of a re-extraction job (admin only)"""
+    try:
+        job = ReextractionJob.objects(id=job_id).first()
+        if not job:
+            return jsonify({'error': 'Re-extraction job not found'}), 404
+        return jsonify(reextraction_job_to_json(job)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def resume_reextraction_job(job_id):
+    """Resume a failed job, or a running one whose runner died, from its checkpoint (admin only)"""
+    try:
+        job = ReextractionJob.objects(id=job_id).first()
+        if not job:
+            return jsonify({'error': 'Re-extraction job not found'}), 404
+        if job.status in ('completed', 'cancelled'):
+            return jsonify({'error': f'Cannot resume job with status {job.status}'}), 400
+        if job.status == 'running' and not is_stale(job):
+            return jsonify({'error': 'Job is already running'}), 409
+
+        # Claimed atomically: a concurrent resume (or the live runner) wins
+        job = start_run(job.id)
+        if not job:
+            return jsonify({'error': 'Job is already running'}), 409
+
+        run_reextraction_job.delay(str(job.id), job.run_token)
+        return jsonify(reextraction_job_to_json(job)), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def cancel_reextraction_job(job_id):
+    """Cancel a re-extraction job; already enqueued documents still run (admin only)"""
+    try:
+        job = ReextractionJob.objects(id=job_id).first()
+        if not job:
+            return jsonify({'error': 'Re-extraction job not found'}), 404
+        if job.status in ('completed', 'cancelled'):
+            return jsonify({'error': f'Cannot cancel job with status {job.status}'}), 400
+
+        job.modify(set__status='cancelled', set__finished_at=datetime.utcnow(),
+                   set__updated_at=datetime.utcnow())
+        return jsonify(reextraction_job_to_json(job)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
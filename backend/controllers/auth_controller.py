@@ -13,6 +13,7 @@ from flask_jwt_extended import (
     unset_jwt_cookies 
 )
 from models import User
+from services.user_cache import get_cached_user
 
 def register():
     """Register a new user"""
@@ -121,7 +122,7 @@ def get_current_user():
     """Get current authenticated user info"""
     try:
         user_id = get_jwt_identity()
-        user = User.objects(id=user_id).first()
+        user = get_cached_user(user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -1,13 +1,22 @@
 # backend/controllers/document_controller.py
 import os
 import base64
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, Response, stream_with_context
 from datetime import datetime
 from models.document import Document
 from models.user import User
 # Import the AI function from its new location
-from task import run_ai_extraction
-from services.cloudinary_service import upload_to_cloudinary
+from task import push_staged_upload
+from services.storage import get_storage
+from services.extraction_cache import hash_upload
+from services.image_processor import keep_original
+from services.inline_images import remember_uploads
+from services.staged_upload import is_staged_mode, spool_upload
+from services.extraction_queue import INTERACTIVE, choose_lane, enqueue_extraction
+from services.idempotency import IdempotencyConflict, begin_request, complete_request, abort_request, forget_replay
+from services.pagination import COUNT_MODES, paginate_keyset, count_documents
+from services.redis_client import get_redis
+from services.status_events import is_green_server, stream_status_events
 import traceback
 
 def allowed_file(filename):
@@ -16,29 +25,118 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 
-def document_to_json(document: Document) -> dict:
-    """Helper function to serialize document object"""
+def document_fields(document):
+    """
+    (getter, id) of a Document or of a raw pymongo document (as_pymongo()).
+    Raw rows go straight to the response: datetimes and ObjectIds are encoded
+    by the app's JSON provider (services/json_provider.py).
+    """
+    if isinstance(document, dict):
+        return document.get, document['_id']
+    return lambda name: getattr(document, name), document.id
+
+def image_url(url):
+    """URL of a stored image as handed to clients (signed for the local storage backend)"""
+    return get_storage().signed_url(url) if url else url
+
+def document_to_json(document) -> dict:
+    """Helper function to serialize document object (Document or raw dict)"""
     try:
+        field, document_id = document_fields(document)
+        status = field('status')
         return {
-            'id': str(document.id),
-            'document_type': document.document_type,
-            'original_filename': document.original_filename,
-            'image_path_recto': document.image_path_recto,
-            'image_path_verso': document.image_path_verso,
-            'status': document.status,
-            'created_at': document.created_at.isoformat(),
-            'updated_at': document.updated_at.isoformat(),
-            'completed_at': document.completed_at.isoformat() if document.completed_at else None,
-            'extracted_data': document.extracted_data if document.status == 'completed' or document.status == 'confirmed' else None,
-            'error_messages': document.error_messages if document.error_messages else None
+            'id': str(document_id),
+            'document_type': field('document_type'),
+            'original_filename': field('original_filename'),
+            'image_path_recto': image_url(field('image_path_recto')),
+            'image_path_verso': image_url(field('image_path_verso')),
+            'status': status,
+            'created_at': field('created_at'),
+            'updated_at': field('updated_at'),
+            'completed_at': field('completed_at'),
+            'extracted_data': field('extracted_data') if status == 'completed' or status == 'confirmed' else None,
+            'error_messages': field('error_messages') or None
         }
     except Exception as e:
         traceback.print_exc()
         raise e
 
+# ?view=summary on the list endpoints: only the list columns are read from Mongo,
+# and extracted_data is narrowed to the names the lists display
+LIST_VIEWS = ('full', 'summary')
+SUMMARY_FIELDS = ('id', 'document_type', 'original_filename', 'status', 'user',
+                  'created_at', 'updated_at', 'completed_at')
+SUMMARY_DATA_FIELDS = ('first_name_fr', 'first_name_ar', 'last_name_fr', 'last_name_ar',
+                       'first_name', 'last_name', 'owner_name_fr', 'owner_name_ar')
+
+
+def get_list_view():
+    """The requested list view ('full' by default), or None if invalid"""
+    view = request.args.get('view', 'full')
+    return view if view in LIST_VIEWS else None
+
+
+# Columns document_to_json reads (hashes, sizes and spool paths are never listed)
+FULL_FIELDS = ('id', 'document_type', 'original_filename', 'image_path_recto', 'image_path_verso',
+               'status', 'user', 'created_at', 'updated_at', 'completed_at', 'extracted_data', 'error_messages')
+
+
+def summary_only(queryset):
+    """Summary projection of a documents queryset (.only)"""
+    return queryset.only(*SUMMARY_FIELDS, *[f'extracted_data.{key}' for key in SUMMARY_DATA_FIELDS])
+
+
+def list_queryset(queryset, view='full'):
+    """
+    Read-only queryset for listings and stats: only the columns of the view
+    are fetched and, with RAW_READS_ENABLED, rows come back as pymongo dicts
+    (as_pymongo()) that the serializers turn straight into the response,
+    without building a MongoEngine Document for every row.
+    """
+    queryset = summary_only(queryset) if view == 'summary' else queryset.only(*FULL_FIELDS)
+    if current_app.config.get('RAW_READS_ENABLED', True):
+        queryset = queryset.as_pymongo()
+    return queryset
+
+
+def document_to_summary_json(document) -> dict:
+    """Compact serializer for list rows; GET /api/documents/<id> returns the full document"""
+    field, document_id = document_fields(document)
+    data = field('extracted_data') if field('status') in ('completed', 'confirmed') else None
+    return {
+        'id': str(document_id),
+        'document_type': field('document_type'),
+        'original_filename': field('original_filename'),
+        'status': field('status'),
+        'created_at': field('created_at'),
+        'updated_at': field('updated_at'),
+        'completed_at': field('completed_at'),
+        'extracted_data': {key: value for key, value in data.items() if value} if data else None,
+        'view': 'summary'
+    }
+
+def upload_response(document: Document) -> dict:
+    """202 body of an upload, matching the frontend DocumentResult interface"""
+    response_data = {
+        'id': str(document.id),
+        'document_id': str(document.id),  # Keep both for compatibility
+        'document_type': document.document_type,
+        'status': document.status,
+        'original_filename': document.original_filename,
+        'image_path_recto': image_url(document.image_path_recto),
+        'created_at': document.created_at.isoformat(),
+        'updated_at': document.updated_at.isoformat(),
+    }
+    # Include verso URL if it exists
+    if document.image_path_verso:
+        response_data['image_path_verso'] = image_url(document.image_path_verso)
+    return response_data
+
 def create_document():
+    user = getattr(request, 'current_user', None)
+    idempotency_key = None
+    claimed = False
     try:
-        user = getattr(request, 'current_user', None)
         if not user: return jsonify({'error': 'User not authenticated'}), 401
         
         document_type = request.form.get('document_type')
@@ -55,10 +153,6 @@ def create_document():
         
         upload_folder = f"uploads/{user.id}/{document_type}"
 
-        cloud_url_recto = None
-        cloud_url_verso = None
-        original_filename = ""
-
         # All document types: recto required, verso optional
         # Check for recto file (required)
         if 'file_recto' not in request.files:
@@ -76,45 +170,90 @@ def create_document():
         if not allowed_file(file_recto.filename):
             return jsonify({'error': 'Invalid recto file format. Only image files are allowed.'}), 400
         
-        cloud_url_recto = upload_to_cloudinary(file_recto, folder=upload_folder)
-        if not cloud_url_recto:
+        # Verso is optional for all document types
+        file_verso = request.files.get('file_verso')
+        if file_verso and file_verso.filename != '':
+            if not allowed_file(file_verso.filename):
+                return jsonify({'error': 'Invalid verso file format. Only image files are allowed.'}), 400
+            original_filename = f"{file_recto.filename}, {file_verso.filename}"
+        else:
+            # No verso file (or an empty field) - that's fine, it's optional
+            file_verso = None
+            original_filename = file_recto.filename
+
+        # Content hash of the original bytes, used by the extraction cache
+        hash_recto = hash_upload(file_recto)
+        hash_verso = hash_upload(file_verso) if file_verso else None
+
+        # A retry / double-click with the same Idempotency-Key gets the first document back
+        idempotency_key = request.headers.get('Idempotency-Key')
+        fingerprint = f"{document_type}:{hash_recto}:{hash_verso or ''}"
+        try:
+            replayed_id = begin_request(str(user.id), idempotency_key, fingerprint)
+            if replayed_id and not Document.objects(id=replayed_id, user=user.id).first():
+                # The first document was deleted since: upload again under the key
+                # (a concurrent retry may have done so first, then it is its key)
+                forget_replay(str(user.id), idempotency_key, fingerprint, replayed_id)
+                replayed_id = begin_request(str(user.id), idempotency_key, fingerprint)
+        except IdempotencyConflict as e:
+            return jsonify({'error': str(e)}), e.status_code
+        if replayed_id:
+            document = Document.objects(id=replayed_id, user=user.id).first()
+            if not document:
+                return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+            return jsonify(upload_response(document)), 200
+        # From here on the key (if any) is ours: released again if the upload fails
+        claimed = True
+
+        if is_staged_mode():
+            # Spool to local disk and answer right away: a worker normalizes
+            # and pushes the files to storage, then queues the extraction
+            document = Document(
+                document_type=document_type,
+                user=user.id,
+                original_filename=original_filename,
+                staged_path_recto=spool_upload(file_recto),
+                staged_path_verso=spool_upload(file_verso) if file_verso else None,
+                image_hash_recto=hash_recto,
+                image_hash_verso=hash_verso,
+                status='staged'
+            )
+            document.save()
+            complete_request(str(user.id), idempotency_key, fingerprint, document.id)
+            claimed = False  # The key now replays this document: never released
+            lane = choose_lane(str(user.id))
+            # Bulk pushes never go to the bulk queue, which only the fair-share
+            # feeder fills: they run on the default queue and their extraction
+            # then waits in the user's fair-share list
+            push_staged_upload.apply_async(args=[str(document.id)], kwargs={'lane': lane, 'tenant': str(user.id)},
+                                           queue=INTERACTIVE if lane == INTERACTIVE else None)
+            return jsonify(upload_response(document)), 202
+
+        # Sync mode stores the original bytes: image normalization (Pillow)
+        # only runs on the workers, for staged uploads
+        normalized_recto = keep_original(file_recto.stream, file_recto.filename, file_recto.content_type)
+        normalized_verso = keep_original(file_verso.stream, file_verso.filename, file_verso.content_type) if file_verso else None
+
+        # Recto and verso are stored together (concurrently on Cloudinary);
+        # if one side fails the other is removed again
+        storage = get_storage()
+        cloud_urls = storage.save_many(
+            [normalized_recto.stream, normalized_verso.stream if normalized_verso else None],
+            folder=upload_folder
+        )
+        if not cloud_urls:
+            abort_request(str(user.id), idempotency_key)
             # Check if it's a configuration issue
-            cloud_name = current_app.config.get('CLOUDINARY_CLOUD_NAME')
-            api_key = current_app.config.get('CLOUDINARY_API_KEY')
-            api_secret = current_app.config.get('CLOUDINARY_API_SECRET')
-            
-            if not cloud_name or not api_key or not api_secret:
-                return jsonify({
-                    'error': 'Cloudinary is not configured. Please check environment variables: CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET'
-                }), 500
+            configuration_error = storage.configuration_error()
+            if configuration_error:
+                return jsonify({'error': configuration_error}), 500
             
             return jsonify({
-                'error': 'Failed to upload recto file to Cloudinary. Please check the file format and try again.'
+                'error': 'Failed to store the document images. Please check the file format and try again.'
             }), 500
-        
-        # Verso is optional for all document types
-        cloud_url_verso = None
-        if 'file_verso' in request.files:
-            file_verso = request.files['file_verso']
-            if file_verso and file_verso.filename != '':
-                if not allowed_file(file_verso.filename):
-                    return jsonify({'error': 'Invalid verso file format. Only image files are allowed.'}), 400
-                
-                cloud_url_verso = upload_to_cloudinary(file_verso, folder=upload_folder)
-                if not cloud_url_verso:
-                    return jsonify({
-                        'error': 'Failed to upload verso file to Cloudinary. Please check the file format and try again.'
-                    }), 500
-                
-                original_filename = f"{file_recto.filename}, {file_verso.filename}"
-            else:
-                # Verso field present but empty - treat as optional
-                original_filename = file_recto.filename
-                cloud_url_verso = None
-        else:
-            # No verso file provided - that's fine, it's optional
-            original_filename = file_recto.filename
-            cloud_url_verso = None
+        cloud_url_recto, cloud_url_verso = cloud_urls
+        # Inline mode: keep the uploaded bytes so the model needn't fetch the URLs
+        remember_uploads(cloud_urls, [normalized_recto, normalized_verso])
 
         # --- Create document in DB ---
         document = Document(
@@ -123,34 +262,29 @@ def create_document():
             original_filename=original_filename,
             image_path_recto=cloud_url_recto,
             image_path_verso=cloud_url_verso,
+            image_hash_recto=hash_recto,
+            image_hash_verso=hash_verso,
+            original_size_recto=normalized_recto.original_size,
+            stored_size_recto=normalized_recto.stored_size,
+            original_size_verso=normalized_verso.original_size if normalized_verso else None,
+            stored_size_verso=normalized_verso.stored_size if normalized_verso else None,
             status='pending'
         )
         document.save()
+        complete_request(str(user.id), idempotency_key, fingerprint, document.id)
+        claimed = False  # The key now replays this document: never released
 
         # --- Queue Celery document ---
-        run_ai_extraction.delay(str(document.id)) 
-
-        # Return response matching DocumentResult interface
-        response_data = {
-            'id': str(document.id),
-            'document_id': str(document.id),  # Keep both for compatibility
-            'document_type': document.document_type,
-            'status': document.status,
-            'original_filename': document.original_filename,
-            'image_path_recto': cloud_url_recto,
-            'created_at': document.created_at.isoformat(),
-            'updated_at': document.updated_at.isoformat(),
-        }
-        
-        # Include verso URL if it exists (for CIN, it's the same image)
-        if cloud_url_verso:
-            response_data['image_path_verso'] = cloud_url_verso
-        
-        return jsonify(response_data), 202
+        # Interactive queue, or the user's fair-share bulk lane during a bulk upload
+        enqueue_extraction(str(document.id), str(user.id), choose_lane(str(user.id)))
+
+        return jsonify(upload_response(document)), 202
     
     except Exception as e:
         import traceback
         traceback.print_exc()
+        if claimed:
+            abort_request(str(user.id), idempotency_key)
         return jsonify({'error': f"Failed to create document: {str(e)}"}), 500
     
 
@@ -164,24 +298,42 @@ def get_user_documents():
             
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 10))
+        pagination = request.args.get('pagination', 'offset')
         
+        view = get_list_view()
+        if not view:
+            return jsonify({'error': f'Invalid view. Must be one of: {", ".join(LIST_VIEWS)}'}), 400
+        serialize_one = document_to_summary_json if view == 'summary' else document_to_json
+
         # Build query
         query = {'user': user.id}
+        queryset = list_queryset(Document.objects(**query), view)
+
+        if pagination == 'cursor':
+            return cursor_page_response(queryset, per_page, filtered=True,
+                                        serialize=lambda docs: [serialize_one(doc) for doc in docs])
+        
+        count_mode = request.args.get('count', 'exact')
+        if count_mode not in COUNT_MODES:
+            return jsonify({'error': f'Invalid count. Must be one of: {", ".join(COUNT_MODES)}'}), 400
         
         # Get paginated documents manually
         skip = (page - 1) * per_page
-        documents_query = Document.objects(**query).order_by('-created_at')
+        documents_query = queryset.order_by('-created_at')
         
         # Get total count
-        total = documents_query.count()
+        total, _ = count_documents(documents_query, count_mode)
         
         # Get paginated items
         documents = documents_query.skip(skip).limit(per_page)
         
         # Calculate total pages
-        total_pages = (total + per_page - 1) // per_page if per_page > 0 else 1
+        if total is None:
+            total_pages = None
+        else:
+            total_pages = (total + per_page - 1) // per_page if per_page > 0 else 1
         
-        documents_list = [document_to_json(document) for document in documents]
+        documents_list = [serialize_one(document) for document in documents]
 
         return jsonify({
             'documents': documents_list,
@@ -194,6 +346,33 @@ def get_user_documents():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def cursor_page_response(queryset, per_page, filtered, serialize=None):
+    """
+    Builds a keyset-paginated listing response (?pagination=cursor&after=<token>).
+    The total is skipped by default (?count=none|estimated|exact) so every page
+    costs the same regardless of depth.
+    """
+    count_mode = request.args.get('count', 'none')
+    if count_mode not in COUNT_MODES:
+        return jsonify({'error': f'Invalid count. Must be one of: {", ".join(COUNT_MODES)}'}), 400
+
+    try:
+        documents, next_cursor = paginate_keyset(queryset, request.args.get('after'), per_page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    total, total_is_estimate = count_documents(queryset, count_mode, filtered=filtered)
+    serialize = serialize or (lambda docs: [document_to_json(doc) for doc in docs])
+
+    return jsonify({
+        'documents': serialize(documents),
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+        'total': total,
+        'total_is_estimate': total_is_estimate
+    }), 200
+
 def get_field_schema():
     """Return grouped field schema per document type for the frontend UI"""
     schema = {
@@ -285,6 +464,48 @@ def get_document(document_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
+def stream_document_status(document_id):
+    """
+    Server-Sent Events stream of a document's status changes.
+    Replaces client polling: one event with the current status, then one per
+    transition, until a terminal status (or the stream timeout, after which
+    the client reconnects). On a threaded server it ends after the first
+    transition or STATUS_LONG_POLL_TIMEOUT, so it never holds a thread long.
+    """
+    try:
+        user = getattr(request, 'current_user', None)
+        if not user:
+            return jsonify({'error': 'User not authenticated'}), 401
+
+        if not Document.objects(id=document_id, user=user.id).only('id').first():
+            return jsonify({'error': 'document not found'}), 404
+
+        def load_status():
+            document = Document.objects(id=document_id).only('status').first()
+            return document.status if document else None
+
+        config = current_app.config
+        green = is_green_server()
+        events = stream_status_events(
+            get_redis(),
+            document_id,
+            load_status,
+            timeout=config.get('STATUS_STREAM_TIMEOUT', 60) if green else config.get('STATUS_LONG_POLL_TIMEOUT', 10),
+            heartbeat=config.get('STATUS_STREAM_HEARTBEAT', 15),
+            until_change=not green
+        )
+        return Response(
+            stream_with_context(events),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'  # Disable proxy buffering (nginx)
+            }
+        )
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
 def update_document_data(document_id):
     """
     Updates a document with the user-validated data from the frontend.
@@ -304,9 +525,9 @@ def update_document_data(document_id):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
 
-        # Persist user-reviewed data and mark as confirmed
-        document.extracted_data = data
-        document.update_status('confirmed')
+        # Persist user-reviewed data and mark as confirmed (atomically, only if still completed)
+        if not document.update_status('confirmed', expected=['completed'], extracted_data=data):
+            return jsonify({'error': f'Cannot confirm document with status {document.status}'}), 409
 
         return jsonify({
             'message': 'document confirmed successfully',
@@ -0,0 +1,40 @@
+# backend/controllers/file_controller.py
+import mimetypes
+import os
+import time
+from flask import jsonify, request, send_file
+from services.storage import get_storage
+
+
+def serve_stored_file(key):
+    """Streams a stored object (local storage backend only) to holders of a signed URL"""
+    try:
+        storage = get_storage()
+        if storage.name != 'local':
+            return jsonify({'error': 'File not found'}), 404
+
+        path = storage.path_for(key)
+        if not path:
+            return jsonify({'error': 'File not found'}), 404
+
+        expires = request.args.get('expires')
+        if not storage.verify_signature(key, expires, request.args.get('signature')):
+            return jsonify({'error': 'Invalid or expired file signature'}), 403
+
+        if not os.path.isfile(path):
+            return jsonify({'error': 'File not found'}), 404
+
+        # Content-addressed objects never change: cacheable until the URL expires.
+        # send_file hands the open file to the WSGI server (sendfile where supported).
+        max_age = max(int(expires) - int(time.time()), 0)
+        response = send_file(
+            path,
+            mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+            max_age=max_age,
+            conditional=True
+        )
+        response.headers['Cache-Control'] = f'private, max-age={max_age}, immutable'
+        return response
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
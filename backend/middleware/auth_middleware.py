@@ -5,7 +5,7 @@ JWT token verification middleware for protected routes using Flask-JWT-Extended.
 from functools import wraps
 from flask import request, jsonify
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
-from models import User
+from services.user_cache import get_cached_user
 
 def auth_required(f):
     """Decorator to require authentication for routes"""
@@ -14,7 +14,8 @@ def auth_required(f):
         try:
             verify_jwt_in_request()
             user_id = get_jwt_identity()
-            user = User.objects(id=user_id).first()
+            # Identity/role/is_active only, served from the short-TTL user cache
+            user = get_cached_user(user_id)
             
             if not user:
                 return jsonify({'error': 'User not found'}), 401
@@ -39,7 +40,8 @@ def admin_required(f):
         try:
             verify_jwt_in_request()
             user_id = get_jwt_identity()
-            user = User.objects(id=user_id).first()
+            # Identity/role/is_active only, served from the short-TTL user cache
+            user = get_cached_user(user_id)
             
             if not user:
                 return jsonify({'error': 'User not found'}), 401
@@ -5,5 +5,6 @@ Simple schema imports for User and document documents.
 
 from .user import User
 from .document import Document
+from .reextraction_job import ReextractionJob
 
-__all__ = ['User', 'Document']
\ No newline at end of file
+__all__ = ['User', 'Document', 'ReextractionJob']
\ No newline at end of file
@@ -2,21 +2,49 @@
 document Model using MongoEngine for Document Extraction documents
 MongoDB document schema for managing document extraction documents.
 """
-from mongoengine import Document, StringField, DateTimeField, ReferenceField, DictField, ListField
+from mongoengine import Document, StringField, DateTimeField, ReferenceField, DictField, ListField, IntField, QuerySet
 from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
 from .user import User
+from services import stats_service
+from services.status_events import publish_status_change
+
+class DocumentQuerySet(QuerySet):
+    """
+    Bulk deletes (Document.objects(...).delete()) remove many documents
+    without reading their type/status: the materialized stats are rebuilt
+    after them instead of being decremented.
+    """
+
+    def delete(self, *args, **kwargs):
+        deleted = super().delete(*args, **kwargs)
+        if deleted:
+            stats_service.record_documents_bulk_deleted()
+        return deleted
+
 
 class Document(Document):
     """Document document schema for document extraction documents"""
     
     # Schema fields
     document_type = StringField(required=True, choices=["cin", "driving_license", "vehicle_registration"])
-    image_path_recto = StringField(required=True)
+    image_path_recto = StringField()  # set once the file is in storage (empty while 'staged')
     image_path_verso = StringField()
+    image_hash_recto = StringField()  # SHA-256 of the uploaded bytes (extraction cache key)
+    image_hash_verso = StringField()
+    # Upload size before/after image normalization, in bytes
+    original_size_recto = IntField()
+    stored_size_recto = IntField()
+    original_size_verso = IntField()
+    stored_size_verso = IntField()
+    # Local spool files of a 'staged' upload, cleared once pushed to Cloudinary
+    staged_path_recto = StringField()
+    staged_path_verso = StringField()
     user = ReferenceField(User, required=True)  
     status = StringField(
         default="pending", 
-        choices=["pending", "processing", "completed", "failed", "confirmed"]
+        choices=["staged", "pending", "processing", "completed", "failed", "confirmed"]
     )
     extracted_data = DictField()
     error_messages = ListField(StringField())
@@ -28,26 +56,127 @@ class Document(Document):
     # MongoDB collection settings
     meta = {
         'collection': 'documents',
+        'queryset_class': DocumentQuerySet,
         'indexes': [
             'user',
             'status',
             'document_type',
-            'created_at',
+            # (created_at, _id) compound keys back the keyset pagination order;
+            # they also serve every query the plain created_at indexes did
+            ('created_at', 'id'),
             ('user', 'status'),
             ('user', 'document_type'),
-            ('user', 'created_at')
+            ('user', 'created_at', 'id'),
+            # Admin listing filters
+            ('status', 'created_at', 'id'),
+            ('document_type', 'status', 'created_at', 'id')
         ]
     }
     
-    def update_status(self, new_status, error_message=None):
-        """Update document status and related fields"""
-        self.status = new_status
-        self.updated_at = datetime.utcnow()
-        
+    def save(self, *args, **kwargs):
+        """Save the document and count new ones in the materialized stats"""
+        is_new = self.pk is None
+        result = super().save(*args, **kwargs)
+        if is_new:
+            stats_service.record_document_created(self.document_type, self.status)
+        return result
+
+    def delete(self, *args, **kwargs):
+        """
+        Delete the document and remove it from the materialized stats, using
+        the type/status read by the delete itself: the in-memory status may
+        be stale after a concurrent update_status.
+        """
+        deleted = self._get_collection().find_one_and_delete(
+            {'_id': self.pk}, projection={'document_type': 1, 'status': 1}
+        )
+        if deleted is not None:
+            stats_service.record_document_deleted(deleted.get('document_type'), deleted.get('status'))
+
+    def update_status(self, new_status, error_message=None, expected=None, **fields):
+        """
+        Update document status and related fields with one atomic, targeted
+        update ($set/$unset/$push) instead of rewriting the document.
+        expected: statuses the document must be in (compare-and-set), e.g.
+        ['pending'] for pending -> processing. Extra fields (e.g.
+        extracted_data) are written in the same update.
+        Returns False, changing nothing, when the document is in another status.
+        """
+        now = datetime.utcnow()
+        fields['status'] = new_status
+        fields['updated_at'] = now
+        if new_status == 'completed' or new_status == 'confirmed':
+            fields['completed_at'] = now
+
+        update = {}
+        for name, value in fields.items():
+            field = self._fields[name]
+            if value is None:
+                update.setdefault('$unset', {})[field.db_field] = ''
+            else:
+                update.setdefault('$set', {})[field.db_field] = field.to_mongo(value)
+        if error_message:
+            update['$push'] = {'error_messages': error_message}
+
+        query = {'_id': self.pk}
+        if expected is not None:
+            query['status'] = {'$in': list(expected)}
+        previous = self._get_collection().find_one_and_update(
+            query, update, projection={'status': 1}, return_document=ReturnDocument.BEFORE
+        )
+        if previous is None:
+            if expected is not None:
+                # Lost the race (or a duplicate delivery): report the current status
+                try:
+                    self.reload('status')
+                except self.DoesNotExist:
+                    pass
+            return False
+
+        # Mirror the write in memory without marking the fields as changed
+        for name, value in fields.items():
+            self._data[name] = value
         if error_message:
             self.error_messages.append(error_message)
-        
-        if new_status == 'completed' or new_status == 'confirmed':
-            self.completed_at = datetime.utcnow()
-        
-        self.save()
+        self._changed_fields = [
+            changed for changed in self._changed_fields
+            if changed.split('.')[0] not in fields and changed.split('.')[0] != 'error_messages'
+        ]
+
+        stats_service.record_status_change(previous.get('status'), new_status)
+        # Notify SSE subscribers (GET /api/documents/<id>/events)
+        publish_status_change(self.id, new_status)
+        return True
+
+    # Statuses a document can be re-extracted from: no extraction task owns it
+    RESETTABLE_STATUSES = ('completed', 'failed', 'confirmed')
+
+    @classmethod
+    def reset_to_pending(cls, document_ids, statuses):
+        """
+        Moves the given documents that are in one of `statuses` (restricted to
+        RESETTABLE_STATUSES) back to 'pending', so a new extraction task can
+        claim them. Each document is moved by its own compare-and-set, so one
+        that changed status meanwhile (e.g. picked up by a task) is left alone.
+        Returns the ids that were reset.
+        """
+        statuses = [status for status in statuses if status in cls.RESETTABLE_STATUSES]
+        if not statuses:
+            return []
+        collection = cls._get_collection()
+        pending = []
+        moved = {}
+        for document_id in document_ids:
+            previous = collection.find_one_and_update(
+                {'_id': ObjectId(document_id), 'status': {'$in': statuses}},
+                {'$set': {'status': 'pending', 'updated_at': datetime.utcnow()}},
+                projection={'status': 1}, return_document=ReturnDocument.BEFORE
+            )
+            if previous is None:
+                continue
+            moved[previous['status']] = moved.get(previous['status'], 0) + 1
+            publish_status_change(document_id, 'pending')
+            pending.append(str(document_id))
+        for status, count in moved.items():
+            stats_service.record_status_change(status, 'pending', count)
+        return pending
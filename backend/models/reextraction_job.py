@@ -0,0 +1,53 @@
+"""
+ReextractionJob Model using MongoEngine
+Tracks a bulk re-extraction run (filters, checkpoint and progress) so an
+interrupted run can be resumed without re-enqueueing finished documents.
+"""
+from mongoengine import Document, StringField, DateTimeField, DictField, IntField, FloatField, ReferenceField
+from datetime import datetime
+from .user import User
+
+class ReextractionJob(Document):
+    """Bulk re-extraction job schema"""
+
+    filters = DictField()
+    status = StringField(
+        default="pending",
+        choices=["pending", "running", "completed", "failed", "cancelled"]
+    )
+    chunk_size = IntField(default=500, min_value=1)
+    rate_limit = FloatField(default=20.0)  # documents enqueued per second (0 = unlimited)
+    total = IntField(default=0)
+    enqueued = IntField(default=0)
+    # Checkpoint: documents are streamed in _id order, everything <= this id is done
+    last_document_id = StringField()
+    elapsed_seconds = FloatField(default=0.0)  # active (running) time across resumes
+    # Token of the active run: batch tasks carrying another token stop, so a
+    # resumed job never has two runners. updated_at is the run's heartbeat.
+    run_token = StringField()
+    error_message = StringField()
+    created_by = ReferenceField(User)
+    created_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField(default=datetime.utcnow)
+    finished_at = DateTimeField()
+
+    meta = {
+        'collection': 'reextraction_jobs',
+        'indexes': [
+            'status',
+            'created_at'
+        ]
+    }
+
+    def throughput(self):
+        """Enqueued documents per second of active run time"""
+        if not self.elapsed_seconds:
+            return None
+        return self.enqueued / self.elapsed_seconds
+
+    def eta_seconds(self):
+        """Estimated seconds until every matching document is enqueued"""
+        rate = self.throughput()
+        if not rate:
+            return None
+        return max(self.total - self.enqueued, 0) / rate
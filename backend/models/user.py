@@ -1,6 +1,7 @@
 from mongoengine import Document, StringField, DateTimeField, BooleanField
 from datetime import datetime
 import bcrypt
+from services.user_cache import invalidate_user
 
 class User(Document):
     """User document schema (Employee)"""
@@ -23,6 +24,17 @@ class User(Document):
         ]
     }
     
+    def save(self, *args, **kwargs):
+        """Save the user and drop it from the auth cache (password, role, is_active may have changed)"""
+        result = super().save(*args, **kwargs)
+        invalidate_user(self.id)
+        return result
+
+    def delete(self, *args, **kwargs):
+        """Delete the user and drop it from the auth cache"""
+        super().delete(*args, **kwargs)
+        invalidate_user(self.id)
+
     def set_password(self, password: str):
         self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
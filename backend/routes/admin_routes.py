@@ -6,7 +6,17 @@ from controllers.admin_controller import (
     get_admin_document,
     update_admin_document,
     delete_admin_document,
-    get_all_users
+    get_all_users,
+    get_extraction_cache_stats,
+    clear_extraction_cache,
+    get_metrics,
+    get_cascade_escalations,
+    get_extraction_queues,
+    start_reextraction,
+    get_reextraction_jobs,
+    get_reextraction_job,
+    resume_reextraction_job,
+    cancel_reextraction_job
 )
 from middleware.auth_middleware import admin_required
 
@@ -35,3 +45,43 @@ def admin_delete_document(document_id): return delete_admin_document(document_id
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
 def admin_all_users(): return get_all_users()
+
+@admin_bp.route('/extraction-cache', methods=['GET'])
+@admin_required
+def admin_extraction_cache_stats(): return get_extraction_cache_stats()
+
+@admin_bp.route('/extraction-cache', methods=['DELETE'])
+@admin_required
+def admin_clear_extraction_cache(): return clear_extraction_cache()
+
+@admin_bp.route('/metrics', methods=['GET'])
+@admin_required
+def admin_metrics(): return get_metrics()
+
+@admin_bp.route('/cascade', methods=['GET'])
+@admin_required
+def admin_cascade_escalations(): return get_cascade_escalations()
+
+@admin_bp.route('/queues', methods=['GET'])
+@admin_required
+def admin_extraction_queues(): return get_extraction_queues()
+
+@admin_bp.route('/reextraction', methods=['POST'])
+@admin_required
+def admin_start_reextraction(): return start_reextraction()
+
+@admin_bp.route('/reextraction', methods=['GET'])
+@admin_required
+def admin_reextraction_jobs(): return get_reextraction_jobs()
+
+@admin_bp.route('/reextraction/<job_id>', methods=['GET'])
+@admin_required
+def admin_reextraction_job(job_id): return get_reextraction_job(job_id)
+
+@admin_bp.route('/reextraction/<job_id>/resume', methods=['POST'])
+@admin_required
+def admin_resume_reextraction(job_id): return resume_reextraction_job(job_id)
+
+@admin_bp.route('/reextraction/<job_id>/cancel', methods=['POST'])
+@admin_required
+def admin_cancel_reextraction(job_id): return cancel_reextraction_job(job_id)
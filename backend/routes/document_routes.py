@@ -1,7 +1,8 @@
 from flask import Blueprint, request
 from controllers.document_controller import (
     create_document, get_user_documents, get_document, update_document_data, 
-    get_field_schema, delete_user_document, update_user_document_data
+    get_field_schema, delete_user_document, update_user_document_data,
+    stream_document_status
 )
 from middleware.auth_middleware import auth_required
 
@@ -22,6 +23,10 @@ def field_schema(): return get_field_schema()
 @auth_required
 def confirm_document_data(document_id): return update_document_data(document_id)
 
+@document_bp.route('/<document_id>/events', methods=['GET'])
+@auth_required
+def document_status_events(document_id): return stream_document_status(document_id)
+
 @document_bp.route('/<document_id>', methods=['GET', 'PUT', 'DELETE'])
 @auth_required
 def document_operations(document_id):
@@ -0,0 +1,13 @@
+"""
+File Routes Blueprint
+Serves objects of the local storage backend (STORAGE_BACKEND=local).
+"""
+from flask import Blueprint
+from controllers.file_controller import serve_stored_file
+
+file_bp = Blueprint('files', __name__)
+
+# No JWT (the model provider and <img> tags fetch these URLs): access needs the
+# HMAC signature of a time-limited URL from an API response (storage.signed_url).
+@file_bp.route('/<path:key>', methods=['GET'])
+def get_stored_file(key): return serve_stored_file(key)
@@ -1,13 +1,31 @@
 # backend/services/ai_processor.py
 
-from openai import OpenAI
 from pydantic import BaseModel, Field, ValidationError, field_validator
+import hashlib
 import json
 import os
+import random
+import socket
+import threading
+import time
+from collections import deque, namedtuple
 from datetime import datetime
 from typing import Optional, List
 from flask import current_app
+from services import metrics
+from services.inline_images import image_payload_url
+from services.openai_client import get_pooled_client
+from services.resilience import call_with_resilience, CircuitOpenError
+from services.extraction_quality import accept_fast_result
+from services import rate_limiter
 
+# Rolling stats of the model router: outcomes kept per endpoint, latency EWMA weight
+ROUTER_STATS_WINDOW = 100
+ROUTER_EWMA_ALPHA = 0.2
+
+# Bump to invalidate cached extractions without a prompt/schema change (the
+# registry hash below already changes whenever the prompt text or a schema does)
+PROMPT_VERSION = 1
 
 # --- Type-Specific Schemas with light validation ---
 
@@ -84,16 +102,9 @@ class CINSchema(BaseModel):
         return _normalize_date(v)
 
 
-# --- AI Extraction Function (Fixed) ---
-def structured_intelligence(image_path_recto: str, document_type: str, image_path_verso: Optional[str] = None) -> dict | None:
-    """
-    Takes an image URL AND a document type,
-    calls OpenAI with the UNIFIED schema,
-    and returns a validated Pydantic object.
-    
-    Handles both single (recto) and double (recto/verso) images.
-    """
-
+# --- Request building / response parsing ---
+def _get_openai_config():
+    """Reads the OpenAI settings from the Flask config, or returns None if incomplete"""
     try:
         API_KEY = current_app.config.get('OPENAI_API_KEY')
         BASE_URL = current_app.config.get('OPENAI_BASE_URL')
@@ -110,12 +121,347 @@ def structured_intelligence(image_path_recto: str, document_type: str, image_pat
                 missing.append('OPENAI_MODEL')
             print(f"❌ Error: OpenAI config not set in Flask app. Missing: {', '.join(missing)}")
             return None
+        return API_KEY, BASE_URL, MODEL
     except Exception as e:
         print(f"❌ Error: Failed to get OpenAI config. Error: {e}")
         return None
 
-    client = OpenAI(api_key=API_KEY, base_url=BASE_URL)
-    
+
+# --- Model router (several endpoints/models, cost- and latency-aware) ---
+class ModelEndpoint:
+    """
+    One (base_url, model) the router can send requests to, with its limits
+    and rolling stats (per process).
+    """
+
+    def __init__(self, name, base_url, api_key, model, weight=1.0, max_concurrency=None,
+                 rpm=None, tpm=None, cost=1.0, accuracy=1.0, tier='large', bucket=None):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.weight = float(weight)
+        self.max_concurrency = max_concurrency
+        # Requests / tokens per minute, shared by every process (services/rate_limiter.py);
+        # endpoints on the same provider quota (API key) share one bucket
+        self.rpm = rpm
+        self.tpm = tpm
+        self.bucket = bucket or name
+        self.cost = float(cost)
+        # A float, or {document_type: float} with an optional 'default'
+        self.accuracy = accuracy
+        # 'fast' endpoints answer first in cascade mode, 'large' ones take escalations
+        self.tier = tier
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.total_calls = 0
+        self.failed_calls = 0
+        self.ewma_latency = None
+        self._outcomes = deque(maxlen=ROUTER_STATS_WINDOW)
+
+    def accuracy_for(self, document_type):
+        if isinstance(self.accuracy, dict):
+            return float(self.accuracy.get(document_type, self.accuracy.get('default', 1.0)))
+        return float(self.accuracy)
+
+    def error_rate(self):
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+    def try_acquire(self):
+        """Takes a concurrency slot, or returns False"""
+        with self._lock:
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, ok):
+        with self._lock:
+            self.in_flight -= 1
+            self.total_calls += 1
+            self._outcomes.append(ok)
+            if not ok:
+                self.failed_calls += 1
+            elif latency is not None:
+                # Exponentially weighted moving average of successful calls
+                self.ewma_latency = latency if self.ewma_latency is None else \
+                    ROUTER_EWMA_ALPHA * latency + (1 - ROUTER_EWMA_ALPHA) * self.ewma_latency
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'model': self.model,
+            'base_url': self.base_url,
+            'tier': self.tier,
+            'in_flight': self.in_flight,
+            'total_calls': self.total_calls,
+            'failed_calls': self.failed_calls,
+            'error_rate': round(self.error_rate(), 4),
+            'ewma_latency_ms': round(self.ewma_latency * 1000) if self.ewma_latency is not None else None,
+        }
+
+
+class ModelRouter:
+    """
+    Picks the endpoint for each request: only endpoints whose accuracy meets
+    the document type's min_accuracy, ordered by the type's preference
+    ('cost', 'latency' or 'weighted'), skipping saturated ones. On failure
+    the next candidate is tried (automatic failover).
+    """
+
+    def __init__(self, endpoints, routing):
+        self.endpoints = endpoints
+        self.routing = routing
+        self._last_published = 0.0
+
+    def _policy(self, document_type):
+        policy = dict(self.routing.get('default', {}))
+        policy.update(self.routing.get(document_type, {}))
+        return policy
+
+    def candidates(self, document_type, tier=None):
+        """Eligible endpoints for a document type (optionally of one tier), best first"""
+        policy = self._policy(document_type)
+        min_accuracy = float(policy.get('min_accuracy', 0))
+        endpoints = [
+            e for e in self.endpoints
+            if e.accuracy_for(document_type) >= min_accuracy and (tier is None or e.tier == tier)
+        ]
+        prefer = policy.get('prefer', 'latency')
+        if prefer == 'cost':
+            endpoints.sort(key=lambda e: (e.cost, e.error_rate()))
+        elif prefer == 'weighted':
+            # Weighted random order (weight = share of traffic)
+            endpoints.sort(key=lambda e: -random.random() ** (1.0 / max(e.weight, 1e-6)))
+        else:
+            # Unknown latency counts as 0 so new endpoints get explored;
+            # errors push an endpoint back
+            endpoints.sort(key=lambda e: ((e.ewma_latency or 0.0) * (1 + 4 * e.error_rate()), e.cost))
+        return endpoints
+
+    def _acquire(self, candidates):
+        """First candidate with a free concurrency slot, or None"""
+        for endpoint in candidates:
+            if endpoint.try_acquire():
+                return endpoint
+        return None
+
+    def _attempts_for(self, index, total):
+        # Failover is the retry while other endpoints remain
+        return 1 if index < total - 1 else None
+
+    def _publish_stats(self):
+        now = time.time()
+        if now - self._last_published < 5:
+            return
+        self._last_published = now
+        ttl = current_app.config.get('METRICS_GAUGE_TTL', 120)
+        scope = f"model_router:{socket.gethostname()}:{os.getpid()}"
+        metrics.set_gauges(scope, {'endpoints': [e.stats() for e in self.endpoints]}, ttl=ttl)
+
+    def _next_endpoint(self, remaining):
+        endpoint = self._acquire(remaining)
+        if endpoint is None:
+            return None
+        remaining.remove(endpoint)
+        return endpoint
+
+    def call(self, document_type, make_request, tier=None, tokens=0, deadline=None):
+        """
+        make_request(endpoint) returns a zero-argument function performing one
+        request; every attempt first waits for the endpoint's rate-limit budget
+        (one request and `tokens` tokens). deadline (time.monotonic()) bounds
+        the whole call, failover included. Returns (endpoint, response).
+        """
+        remaining = self.candidates(document_type, tier)
+        if not remaining:
+            raise RuntimeError(f"No {tier or 'model'} endpoint configured for {document_type}")
+        total = len(remaining)
+        wait_deadline = time.monotonic() + current_app.config.get('MODEL_ROUTER_WAIT_TIMEOUT', 30.0)
+        if deadline is not None:
+            wait_deadline = min(wait_deadline, deadline)
+        errors = []
+        while remaining:
+            endpoint = self._next_endpoint(remaining)
+            if endpoint is None:
+                if time.monotonic() < wait_deadline:
+                    time.sleep(0.05)  # Every candidate saturated: wait for a slot
+                    continue
+                raise RuntimeError('All model endpoints are saturated')
+            started = time.monotonic()
+            throttled = []  # rate-limit waits, left out of the endpoint's latency
+
+            def _acquire(endpoint=endpoint):
+                throttled.append(rate_limiter.acquire(endpoint.bucket, endpoint.rpm, endpoint.tpm, tokens))
+
+            try:
+                response = call_with_resilience(
+                    _settled(endpoint, make_request(endpoint), tokens), breaker_name=endpoint.name,
+                    max_attempts=self._attempts_for(total - len(remaining) - 1, total),
+                    before_attempt=_acquire,
+                    hedge_allowed=lambda endpoint=endpoint: rate_limiter.try_acquire(
+                        endpoint.bucket, endpoint.rpm, endpoint.tpm, tokens),
+                    deadline=deadline
+                )
+            except Exception as e:
+                endpoint.release(None, ok=isinstance(e, CircuitOpenError))
+                errors.append(e)
+                if remaining:
+                    metrics.incr(f"model.router.failovers.{endpoint.name}")
+                    print(f"⚠ Model endpoint {endpoint.name} failed ({type(e).__name__}), failing over")
+                continue
+            endpoint.release(time.monotonic() - started - sum(throttled), ok=True)
+            self._publish_stats()
+            return endpoint, response
+        raise _routing_error(errors)
+
+
+def _settled(endpoint, request, tokens):
+    """
+    Wraps one request so its token reservation is corrected with the real
+    usage. The budget itself is taken before the attempt (acquire) or the
+    hedge (try_acquire), outside the request's timers.
+    """
+    def _request():
+        response = request()
+        rate_limiter.settle(endpoint.bucket, endpoint.tpm, tokens, response)
+        return response
+    return _request
+
+
+def _routing_error(errors):
+    """The error to surface once every candidate failed"""
+    real_errors = [e for e in errors if not isinstance(e, CircuitOpenError)]
+    if real_errors:
+        return real_errors[-1]
+    # Every endpoint is circuit-open: defer until the first one closes
+    return min(errors, key=lambda e: e.retry_after)
+
+
+def _load_endpoints():
+    """
+    Endpoints from MODEL_ENDPOINTS (JSON list), or the single OPENAI_* endpoint.
+    Returns None when nothing usable is configured.
+    """
+    config = current_app.config
+    raw = config.get('MODEL_ENDPOINTS')
+    if not raw:
+        openai_config = _get_openai_config()
+        if not openai_config:
+            return None
+        api_key, base_url, model = openai_config
+        # Named like the breaker used before the router existed
+        limits = {'rpm': config.get('RATE_LIMIT_RPM') or None, 'tpm': config.get('RATE_LIMIT_TPM') or None}
+        endpoints = [ModelEndpoint('openai', base_url, api_key, model, **limits)]
+        if config.get('CASCADE_ENABLED') and config.get('CASCADE_FAST_MODEL'):
+            # Same key and limits: both models spend the one 'openai' budget
+            endpoints.append(ModelEndpoint('openai-fast', base_url, api_key, config['CASCADE_FAST_MODEL'],
+                                           tier='fast', bucket='openai', **limits))
+        return endpoints
+
+    endpoints = []
+    for index, spec in enumerate(json.loads(raw) if isinstance(raw, str) else raw):
+        name = spec.get('name') or f"endpoint{index}"
+        # Keys come from the environment, never from the JSON itself
+        api_key = os.environ.get(spec.get('api_key_env', 'OPENAI_API_KEY')) or config.get('OPENAI_API_KEY')
+        base_url = spec.get('base_url') or config.get('OPENAI_BASE_URL')
+        if not api_key or not base_url:
+            print(f"⚠ Model endpoint {name} skipped: missing API key or base URL")
+            continue
+        endpoints.append(ModelEndpoint(
+            name=name,
+            base_url=base_url,
+            api_key=api_key,
+            model=spec['model'],
+            weight=spec.get('weight', 1.0),
+            max_concurrency=spec.get('max_concurrency'),
+            rpm=spec.get('rpm'),
+            tpm=spec.get('tpm'),
+            cost=spec.get('cost', 1.0),
+            accuracy=spec.get('accuracy', 1.0),
+            tier=spec.get('tier', 'large'),
+            bucket=spec.get('bucket'),
+        ))
+    return endpoints
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def get_model_router():
+    """The process-wide router for the current endpoint configuration (None if unconfigured)"""
+    config = current_app.config
+    fingerprint = (
+        os.getpid(), str(config.get('MODEL_ENDPOINTS') or ''), str(config.get('MODEL_ROUTING') or ''),
+        config.get('OPENAI_BASE_URL'), config.get('OPENAI_MODEL'),
+        config.get('CASCADE_ENABLED'), config.get('CASCADE_FAST_MODEL'),
+        config.get('RATE_LIMIT_RPM'), config.get('RATE_LIMIT_TPM'),
+    )
+    router = _routers.get(fingerprint)
+    if router is None:
+        with _routers_lock:
+            router = _routers.get(fingerprint)
+            if router is None:
+                try:
+                    endpoints = _load_endpoints()
+                    routing = config.get('MODEL_ROUTING') or {}
+                    routing = json.loads(routing) if isinstance(routing, str) else routing
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"❌ Error: invalid MODEL_ENDPOINTS / MODEL_ROUTING: {e}")
+                    return None
+                if not endpoints:
+                    return None
+                router = ModelRouter(endpoints, routing)
+                _routers[fingerprint] = router
+                names = ', '.join(f"{e.name}={e.model} ({e.tier})" for e in endpoints)
+                print(f"⚙ Model router ready: {names}")
+    return router
+
+
+def cascade_enabled(router):
+    """Cascade mode is on and the router has both a fast and a large tier"""
+    if not current_app.config.get('CASCADE_ENABLED', False):
+        return False
+    tiers = {e.tier for e in router.endpoints}
+    return 'fast' in tiers and 'large' in tiers
+
+
+def model_fingerprint():
+    """Models the router may answer with (part of the extraction cache key)"""
+    router = get_model_router()
+    if not router:
+        return current_app.config.get('OPENAI_MODEL') or ''
+    return ','.join(sorted({e.model for e in router.endpoints}))
+
+
+# --- Prompt / schema registry (built once at import) ---
+# Image layouts a prompt is written for
+PROMPT_LAYOUTS = ('recto', 'recto_verso', 'combined')
+
+SCHEMAS_BY_TYPE = {
+    'vehicle_registration': VehicleRegistrationSchema,
+    'driving_license': DrivingLicenseSchema,
+    'cin': CINSchema,
+}
+
+# One prebuilt, immutable request template per (document_type, layout)
+PromptEntry = namedtuple('PromptEntry', ['system_prompt', 'response_format', 'model_cls', 'prompt_hash'])
+
+
+def _prompt_layout(image_path_recto: str, image_path_verso: Optional[str]) -> str:
+    if image_path_verso and image_path_verso != image_path_recto:
+        return 'recto_verso'  # Two separate images
+    if image_path_verso == image_path_recto:
+        return 'combined'  # One image with both sides
+    return 'recto'  # Verso missing (optional)
+
+
+def _render_system_prompt(document_type: str, layout: str) -> str:
+    """The system prompt text for a document type and image layout"""
     # --- MODIFIED: Dynamic System Prompt ---
     system_prompt = (
         f"You are an expert OCR assistant for Moroccan documents. "
@@ -141,14 +487,14 @@ def structured_intelligence(image_path_recto: str, document_type: str, image_pat
     # Add context based on document type and image configuration
     if document_type == 'cin':
         # For CIN, check if verso exists and is different (two separate images) or same (combined image) or None (only recto)
-        if image_path_verso and image_path_verso != image_path_recto:
+        if layout == 'recto_verso':
             # Two separate images provided
             system_prompt += (
                 "\nThe user has provided TWO separate images: "
                 "the first image is the RECTO (Front) and the second image is the VERSO (Back). "
                 "You must extract data from BOTH images to fill the schema (e.g., address is on the verso)."
             )
-        elif image_path_verso == image_path_recto:
+        elif layout == 'combined':
             # Single combined image (one image with both sides)
             system_prompt += (
                 "\nThe user has provided ONE image that contains BOTH the front (RECTO) and back (VERSO) sides of the CIN card combined together. "
@@ -164,35 +510,83 @@ def structured_intelligence(image_path_recto: str, document_type: str, image_pat
             )
     elif document_type == 'driving_license':
         system_prompt += "\nThe user has provided ONE image of the RECTO (Front) of the driving license."
-        if image_path_verso:
+        if layout != 'recto':
             system_prompt += " They also provided a VERSO (Back) image, which contains categories. Extract categories from the verso image."
     else:
         system_prompt += "\nThe user has provided ONE image."
     # --- END MODIFICATION ---
+    return system_prompt
+
+
+def _build_prompt_entry(document_type: str, layout: str) -> PromptEntry:
+    system_prompt = _render_system_prompt(document_type, layout)
+    model_cls = SCHEMAS_BY_TYPE.get(document_type, CINSchema)
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": f"{document_type}_schema",
+            "schema": model_cls.model_json_schema(), 
+        },
+    }
+    # Stable across processes and restarts: changes only when the text or schema does
+    canonical = json.dumps([PROMPT_VERSION, system_prompt, response_format], sort_keys=True, ensure_ascii=False)
+    prompt_hash = hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+    return PromptEntry(system_prompt, response_format, model_cls, prompt_hash)
+
+
+PROMPT_REGISTRY = {
+    (document_type, layout): _build_prompt_entry(document_type, layout)
+    for document_type in SCHEMAS_BY_TYPE
+    for layout in PROMPT_LAYOUTS
+}
+# Hash of every prompt and schema: part of the extraction cache key
+PROMPT_REGISTRY_HASH = hashlib.sha256(
+    '|'.join(f"{key[0]}:{key[1]}:{entry.prompt_hash}" for key, entry in sorted(PROMPT_REGISTRY.items())).encode('utf-8')
+).hexdigest()[:16]
+
+
+def get_prompt_entry(document_type: str, layout: str) -> PromptEntry:
+    entry = PROMPT_REGISTRY.get((document_type, layout))
+    if entry is None:
+        # Unknown type (not reachable through the API): build it, uncached
+        entry = _build_prompt_entry(document_type, layout)
+    return entry
+
+
+def _build_request(image_path_recto: str, document_type: str, image_path_verso: Optional[str] = None):
+    """
+    Builds the chat messages, the response_format and the schema class for a
+    document, plus the image mode used ('url', 'inline' or 'mixed').
+    Prompt and schema come prebuilt from the registry, so every call sends a
+    byte-identical prefix (friendly to the provider's prompt caching).
+    """
+    layout = _prompt_layout(image_path_recto, image_path_verso)
+    entry = get_prompt_entry(document_type, layout)
 
-    
-    # --- MODIFIED: Dynamic Messages List ---
-    # We build the list of messages dynamically
-    
     # 1. Start with the system prompt
     messages_payload = [
-        {"role": "system", "content": system_prompt}
+        {"role": "system", "content": entry.system_prompt}
     ]
     
     # 2. Create the user content (which is a list of images)
     user_content_list = []
     
     # Add the Recto image (always present)
+    # (inline mode: data URI of the kept upload bytes instead of the URL)
+    recto_url, image_mode = image_payload_url(image_path_recto)
     user_content_list.append({
         "type": "image_url",
-        "image_url": {"url": image_path_recto}
+        "image_url": {"url": recto_url}
     })
     
     # Add the Verso image ONLY if it exists AND is different from recto
-    if image_path_verso and image_path_verso != image_path_recto:
+    if layout == 'recto_verso':
+        verso_url, verso_mode = image_payload_url(image_path_verso)
+        if verso_mode != image_mode:
+            image_mode = 'mixed'
         user_content_list.append({
             "type": "image_url",
-            "image_url": {"url": image_path_verso}
+            "image_url": {"url": verso_url}
         })
         
     # 3. Add the user content block to the main messages payload
@@ -200,60 +594,111 @@ def structured_intelligence(image_path_recto: str, document_type: str, image_pat
         "role": "user",
         "content": user_content_list
     })
-    # --- END MODIFICATION ---
 
-    try:
-        # Select schema per document type
-        model_map = {
-            'vehicle_registration': VehicleRegistrationSchema,
-            'driving_license': DrivingLicenseSchema,
-            'cin': CINSchema,
-        }
-        model_cls = model_map.get(document_type, CINSchema)
-
-        # Step 1: Call the OpenAI API
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=messages_payload,  # <-- Use the new dynamic payload
-            response_format={
-                "type": "json_schema",
-                "json_schema": {
-                    "name": f"{document_type}_schema",
-                    "schema": model_cls.model_json_schema(), 
-                },
-            },
-            timeout=120.0,  # 2 minutes timeout for large images
-        )
+    return messages_payload, entry.response_format, entry.model_cls, image_mode
 
-        content = response.choices[0].message.content
-        print(f"\n📦 Raw Response ({document_type}):")
-        print(content)
 
-        # Step 2: Parse and Validate the response
-        json_data = json.loads(content)
-        parsed_result = model_cls.model_validate(json_data)
-        
-        # Step 3: Return normalized dict
-        return parsed_result.model_dump()
+def _parse_response(response, document_type: str, model_cls) -> dict:
+    """Parses and validates the model output, returning the normalized dict"""
+    content = response.choices[0].message.content
+    print(f"\n📦 Raw Response ({document_type}):")
+    print(content)
+
+    # Step 2: Parse and Validate the response
+    json_data = json.loads(content)
+    parsed_result = model_cls.model_validate(json_data)
     
-    except (json.JSONDecodeError, ValidationError) as e:
+    # Step 3: Return normalized dict
+    return parsed_result.model_dump()
+
+
+def _log_extraction_error(e: Exception, document_type: str, image_path_recto: str, image_path_verso: Optional[str]):
+    if isinstance(e, (json.JSONDecodeError, ValidationError)):
         print(f"❌ Error: Failed to parse or validate AI response.")
         print(f"   Error Type: {type(e).__name__}")
         print(f"   Error Message: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return None
-    except Exception as e:
-        error_type = type(e).__name__
-        error_message = str(e)
+    else:
         print(f"❌ Error: OpenAI API call failed.")
-        print(f"   Error Type: {error_type}")
-        print(f"   Error Message: {error_message}")
+        print(f"   Error Type: {type(e).__name__}")
+        print(f"   Error Message: {str(e)}")
         print(f"   Document Type: {document_type}")
         print(f"   Image Recto: {image_path_recto}")
         if image_path_verso:
             print(f"   Image Verso: {image_path_verso}")
-        import traceback
-        traceback.print_exc()
+    import traceback
+    traceback.print_exc()
+
+
+# --- AI Extraction Function (Fixed) ---
+def structured_intelligence(image_path_recto: str, document_type: str, image_path_verso: Optional[str] = None) -> dict | None:
+    """
+    Takes an image URL AND a document type,
+    calls OpenAI with the UNIFIED schema,
+    and returns a validated Pydantic object.
+    
+    Handles both single (recto) and double (recto/verso) images.
+    The model endpoint is chosen by the model router (MODEL_ENDPOINTS), with
+    failover to the next endpoint. In cascade mode (CASCADE_ENABLED) a fast
+    model answers first and the large one is only called when that answer
+    fails the quality checks of services/extraction_quality.py. Raises CircuitOpenError (without calling
+    the model) while every eligible endpoint's circuit breaker is open.
+    """
+    router = get_model_router()
+    if not router:
         return None
 
+    try:
+        messages_payload, response_format, model_cls, image_mode = _build_request(
+            image_path_recto, document_type, image_path_verso
+        )
+
+        request_timeout = current_app.config.get('OPENAI_REQUEST_TIMEOUT', 120.0)
+        # One deadline for every request of this document (retries, failover, cascade)
+        deadline = time.monotonic() + current_app.config.get('EXTRACTION_CALL_TIMEOUT', 150.0)
+        # Reserved from the endpoint's tokens-per-minute budget, corrected with the real usage
+        tokens = rate_limiter.estimate_tokens(len(messages_payload[1]['content']))
+
+        def _request_for(endpoint):
+            # Reuse the process-wide client so the keep-alive pool survives between tasks
+            pooled_client = get_pooled_client(endpoint.api_key, endpoint.base_url)
+
+            def _create_completion():
+                with pooled_client.track() as client:
+                    return client.chat.completions.create(
+                        model=endpoint.model,
+                        messages=messages_payload,  # <-- Use the new dynamic payload
+                        response_format=response_format,
+                        # Cut to the deadline: a slow (or losing hedge) request is dropped with it
+                        timeout=max(min(request_timeout, deadline - time.monotonic()), 1.0),
+                    )
+            return _create_completion
+
+        def _extract(tier):
+            # Step 1: Call the model (routing/failover, retries, hedging, circuit breaker)
+            started = time.monotonic()
+            endpoint, response = router.call(document_type, _request_for, tier=tier, tokens=tokens,
+                                             deadline=deadline)
+            # Per image mode, to compare inline data URIs with provider-fetched URLs
+            metrics.observe(f"extraction.latency.{image_mode}", (time.monotonic() - started) * 1000)
+            metrics.incr(f"model.router.calls.{endpoint.name}")
+            return _parse_response(response, document_type, model_cls)
+
+        if not cascade_enabled(router):
+            return _extract(None)
+
+        # Cascade: the fast model answers first, the large one only if the answer fails the checks
+        try:
+            fast_result = _extract('fast')
+        except Exception as e:
+            print(f"⚠ Cascade: fast model failed ({type(e).__name__}: {e})")
+            fast_result = None
+        if accept_fast_result(document_type, fast_result, current_app.config.get('CASCADE_MIN_SCORE', 0.9)):
+            return fast_result
+        return _extract('large')
+
+    except CircuitOpenError:
+        # Not attempted: the caller defers the document
+        raise
+    except Exception as e:
+        _log_extraction_error(e, document_type, image_path_recto, image_path_verso)
+        return None
@@ -1,8 +1,17 @@
 # backend/services/cloudinary_service.py
+import os
+import threading
+import time
 import cloudinary
 import cloudinary.uploader
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from flask import current_app
 
+# Shared by every request thread of the process (see _get_upload_pool)
+_upload_pool = None
+_upload_pool_pid = None
+_upload_pool_lock = threading.Lock()
+
 def configure_cloudinary():
     """Initializes Cloudinary configuration from Flask app config"""
     cloud_name = current_app.config.get('CLOUDINARY_CLOUD_NAME')
@@ -40,17 +49,7 @@ def upload_to_cloudinary(file_to_upload, folder="document_uploads"):
         # Configure Cloudinary (it's safe to call this multiple times)
         configure_cloudinary()
         
-        # Get filename for better format detection
-        filename = getattr(file_to_upload, 'filename', '')
-        
-        # Upload the file with explicit image resource type
-        # Cloudinary will handle format conversion if needed
-        upload_result = cloudinary.uploader.upload(
-            file_to_upload,
-            folder=folder,
-            resource_type="image",  # Explicitly set as image to support all image formats
-            flags="immutable_cache"  # Cache optimization
-        )
+        upload_result = _upload(file_to_upload, folder)
         
         # Return the secure (https) URL
         return upload_result.get('secure_url')
@@ -60,21 +59,125 @@ def upload_to_cloudinary(file_to_upload, folder="document_uploads"):
         print(f"❌ Cloudinary configuration error: {e}")
         return None
     except Exception as e:
-        # Log detailed error information
-        error_type = type(e).__name__
-        error_message = str(e)
-        filename = getattr(file_to_upload, 'filename', 'unknown')
-        file_size = getattr(file_to_upload, 'content_length', 'unknown')
-        
-        print(f"❌ Error uploading to Cloudinary:")
-        print(f"   Error Type: {error_type}")
-        print(f"   Error Message: {error_message}")
-        print(f"   File: {filename}")
-        print(f"   File Size: {file_size} bytes")
-        
-        # Import traceback for detailed error logging
-        import traceback
-        print(f"   Traceback:")
-        traceback.print_exc()
-        
+        _log_upload_error(e, file_to_upload)
         return None
+
+
+def upload_many_to_cloudinary(files, folder="document_uploads"):
+    """
+    Uploads several files concurrently through the shared upload pool.
+    Entries of `files` may be None (e.g. no verso); they stay None.
+    
+    :param files: List of file objects or local paths
+    :param folder: The Cloudinary folder to upload into
+    :return: Secure URLs in input order, or None if any upload failed or
+             timed out (the uploads that did succeed are deleted again)
+    """
+    try:
+        configure_cloudinary()
+    except ValueError as e:
+        print(f"❌ Cloudinary configuration error: {e}")
+        return None
+
+    timeout = current_app.config.get('CLOUDINARY_UPLOAD_TIMEOUT', 60)
+    pool = _get_upload_pool()
+    futures = [pool.submit(_upload, f, folder, timeout) if f is not None else None for f in files]
+    # Every upload starts now, so each one gets `timeout` seconds from here
+    deadline = time.monotonic() + timeout
+
+    results = []
+    failed = False
+    for file_to_upload, future in zip(files, futures):
+        if future is None:
+            results.append(None)
+            continue
+        try:
+            results.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+        except FutureTimeoutError:
+            print(f"❌ Cloudinary upload timed out after {timeout}s: {_describe(file_to_upload)}")
+            # Still running: delete it if it completes after all
+            future.add_done_callback(_destroy_late_upload)
+            results.append(None)
+            failed = True
+        except Exception as e:
+            _log_upload_error(e, file_to_upload)
+            results.append(None)
+            failed = True
+
+    if failed:
+        # All-or-nothing: don't leave a recto without its verso behind
+        for upload_result in results:
+            if upload_result:
+                _destroy(upload_result)
+        return None
+
+    return [upload_result.get('secure_url') if upload_result else None for upload_result in results]
+
+
+def _upload(file_to_upload, folder, timeout=None):
+    """Raw upload (Cloudinary must already be configured)"""
+    options = {
+        'folder': folder,
+        'resource_type': "image",  # Explicitly set as image to support all image formats
+        'flags': "immutable_cache"  # Cache optimization
+    }
+    if timeout:
+        options['timeout'] = timeout
+    # Cloudinary will handle format conversion if needed
+    return cloudinary.uploader.upload(file_to_upload, **options)
+
+
+def _get_upload_pool():
+    """Process-wide upload thread pool, created lazily (after gunicorn/Celery have forked)"""
+    global _upload_pool, _upload_pool_pid
+    pid = os.getpid()
+    if _upload_pool is None or _upload_pool_pid != pid:
+        with _upload_pool_lock:
+            if _upload_pool is None or _upload_pool_pid != pid:
+                _upload_pool = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('CLOUDINARY_UPLOAD_WORKERS', 8),
+                    thread_name_prefix='cloudinary-upload'
+                )
+                _upload_pool_pid = pid
+    return _upload_pool
+
+
+def _destroy(upload_result):
+    public_id = upload_result.get('public_id')
+    if not public_id:
+        return
+    try:
+        cloudinary.uploader.destroy(public_id, resource_type="image", invalidate=True)
+        print(f"🧹 Removed partial Cloudinary upload {public_id}")
+    except Exception as e:
+        print(f"⚠ Failed to remove partial Cloudinary upload {public_id}: {e}")
+
+
+def _destroy_late_upload(future):
+    if not future.cancelled() and future.exception() is None:
+        _destroy(future.result())
+
+
+def _describe(file_to_upload):
+    if isinstance(file_to_upload, str):
+        return file_to_upload
+    return getattr(file_to_upload, 'filename', 'unknown')
+
+
+def _log_upload_error(e, file_to_upload):
+    # Log detailed error information
+    error_type = type(e).__name__
+    error_message = str(e)
+    filename = _describe(file_to_upload)
+    file_size = getattr(file_to_upload, 'content_length', 'unknown')
+    
+    print(f"❌ Error uploading to Cloudinary:")
+    print(f"   Error Type: {error_type}")
+    print(f"   Error Message: {error_message}")
+    print(f"   File: {filename}")
+    print(f"   File Size: {file_size} bytes")
+    
+    # Import traceback for detailed error logging
+    import traceback
+    print(f"   Traceback:")
+    traceback.print_exc()
@@ -0,0 +1,151 @@
+# backend/services/extraction_cache.py
+"""
+Content-hash extraction cache in front of structured_intelligence.
+Entries are keyed by the SHA-256 of the recto/verso bytes, the document type,
+the prompt registry hash and the routed models, and live in Redis with a TTL plus an LRU
+index (sorted set scored by last access) that caps the number of entries.
+"""
+import hashlib
+import json
+import time
+from flask import current_app
+from services.redis_client import get_redis
+from services.ai_processor import PROMPT_REGISTRY_HASH, model_fingerprint
+from services import metrics
+
+KEY_PREFIX = 'extraction_cache:entry:'
+LRU_KEY = 'extraction_cache:lru'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_upload(file_to_hash):
+    """
+    Returns the SHA-256 hex digest of an uploaded file (werkzeug FileStorage).
+    The stream is read in chunks and rewound so it can still be uploaded.
+    """
+    stream = getattr(file_to_hash, 'stream', file_to_hash)
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def build_cache_key(document):
+    """
+    Builds the cache key for a document, or None when the document has no
+    content hash (e.g. documents uploaded before hashing was introduced).
+    """
+    if not document.image_hash_recto:
+        return None
+
+    parts = [
+        document.document_type,
+        document.image_hash_recto,
+        document.image_hash_verso or '',
+        PROMPT_REGISTRY_HASH,
+        model_fingerprint(),
+    ]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _is_enabled():
+    return current_app.config.get('EXTRACTION_CACHE_ENABLED', False)
+
+
+def get_cached_extraction(cache_key):
+    """Returns the cached extraction dict for cache_key, or None on a miss"""
+    if not cache_key or not _is_enabled():
+        return None
+
+    ttl = current_app.config.get('EXTRACTION_CACHE_TTL', 30 * 24 * 3600)
+
+    try:
+        r = get_redis()
+        raw = r.get(KEY_PREFIX + cache_key)
+        if raw is None:
+            # Expired through the TTL (or evicted): drop the stale index member
+            r.zrem(LRU_KEY, cache_key)
+            metrics.incr('extraction_cache.misses')
+            return None
+
+        # Touch the entry (index score and value TTL) so hot scans stay cached
+        pipe = r.pipeline()
+        pipe.expire(KEY_PREFIX + cache_key, ttl)
+        pipe.zadd(LRU_KEY, {cache_key: time.time()})
+        pipe.execute()
+        metrics.incr('extraction_cache.hits')
+        return json.loads(raw)
+    except Exception as e:
+        print(f"⚠ Extraction cache lookup failed: {e}")
+        return None
+
+
+def store_extraction(cache_key, extracted_data):
+    """Stores an extraction result and evicts the least recently used entries"""
+    if not cache_key or not _is_enabled():
+        return
+
+    ttl = current_app.config.get('EXTRACTION_CACHE_TTL', 30 * 24 * 3600)
+    max_entries = current_app.config.get('EXTRACTION_CACHE_MAX_ENTRIES', 50000)
+
+    try:
+        r = get_redis()
+        now = time.time()
+        pipe = r.pipeline()
+        pipe.set(KEY_PREFIX + cache_key, json.dumps(extracted_data), ex=ttl)
+        pipe.zadd(LRU_KEY, {cache_key: now})
+        # Drop index entries whose value already expired through the TTL
+        pipe.zremrangebyscore(LRU_KEY, '-inf', now - ttl)
+        pipe.zcard(LRU_KEY)
+        size = pipe.execute()[-1]
+
+        overflow = size - max_entries
+        if overflow > 0:
+            evicted = [member for member, _ in r.zpopmin(LRU_KEY, overflow)]
+            if evicted:
+                r.delete(*[KEY_PREFIX + member.decode('utf-8') for member in evicted])
+                metrics.incr('extraction_cache.evictions', len(evicted))
+    except Exception as e:
+        print(f"⚠ Extraction cache store failed: {e}")
+
+
+def invalidate_extraction_cache():
+    """
+    Removes every cached extraction (e.g. after a provider-side model update
+    that does not change the cache key). Returns the number of removed entries.
+    """
+    r = get_redis()
+    removed = 0
+    while True:
+        members = r.zrange(LRU_KEY, 0, 999)
+        if not members:
+            break
+        r.delete(*[KEY_PREFIX + member.decode('utf-8') for member in members])
+        r.zrem(LRU_KEY, *members)
+        removed += len(members)
+    return removed
+
+
+def get_cache_stats():
+    """Returns hit/miss counters and the current number of entries"""
+    counters = metrics.get_counters(prefix='extraction_cache.')
+    hits = counters.get('extraction_cache.hits', 0)
+    misses = counters.get('extraction_cache.misses', 0)
+    lookups = hits + misses
+
+    try:
+        entries = get_redis().zcard(LRU_KEY)
+    except Exception as e:
+        print(f"⚠ Extraction cache stats failed: {e}")
+        entries = None
+
+    return {
+        'enabled': _is_enabled(),
+        'entries': entries,
+        'hits': hits,
+        'misses': misses,
+        'evictions': counters.get('extraction_cache.evictions', 0),
+        'hit_rate': round(hits / lookups, 4) if lookups else None,
+    }
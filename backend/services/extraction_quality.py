@@ -0,0 +1,136 @@
+# backend/services/extraction_quality.py
+"""
+Quality score of an extraction, used by the cascade mode of
+structured_intelligence: the fast model's answer is kept only when it passes
+these checks, otherwise the document is escalated to the large model.
+Checks (on the validated schema output):
+- required fields of the document type are present
+- dates are real dd/mm/yyyy dates
+- identifiers (CIN number, VIN) have their expected format
+- FR/AR pairs are consistent: both present or both absent, each in its script
+Escalation counters per document type are exported through services.metrics.
+"""
+import re
+from datetime import datetime
+from services import metrics
+
+REQUIRED_FIELDS = {
+    'cin': ('card_number', 'last_name_fr', 'first_name_fr', 'birth_date'),
+    'driving_license': ('license_number', 'last_name', 'first_name', 'birth_date'),
+    'vehicle_registration': ('registration_number', 'owner_name_fr', 'vin'),
+}
+
+# Identifier formats per field (CIN: 1-2 letters then digits; VIN: 17 chars, no I/O/Q)
+ID_PATTERNS = {
+    'card_number': re.compile(r'^[A-Z]{1,2}\d{1,7}$'),
+    'cin_number': re.compile(r'^[A-Z]{1,2}\d{1,7}$'),
+    'vin': re.compile(r'^[A-HJ-NPR-Z0-9]{17}$'),
+}
+
+DATE_FORMAT = '%d/%m/%Y'
+ARABIC_SCRIPT = re.compile(r'[\u0600-\u06FF]')
+LATIN_SCRIPT = re.compile(r'[A-Za-z]')
+# Pairs whose FR and AR values describe the same thing (addresses are often on one side only)
+BILINGUAL_PAIRS = ('last_name', 'first_name', 'father_name', 'mother_name', 'owner_name', 'birth_place')
+
+CASCADE_REASONS = ('fast_error', 'missing_required', 'low_score')
+
+
+def _is_date(value):
+    try:
+        datetime.strptime(value, DATE_FORMAT)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def score_extraction(document_type, data):
+    """
+    Returns (score, problems): score is the share of passed checks (0.0-1.0),
+    problems the list of failed checks ('missing:<field>', 'date:<field>', ...).
+    """
+    problems = []
+    checks = 0
+
+    for field in REQUIRED_FIELDS.get(document_type, ()):
+        checks += 1
+        if not data.get(field):
+            problems.append(f"missing:{field}")
+
+    for field, value in data.items():
+        if not value or not isinstance(value, str):
+            continue
+        if field.endswith('_date'):
+            checks += 1
+            if not _is_date(value):
+                problems.append(f"date:{field}")
+        pattern = ID_PATTERNS.get(field)
+        if pattern:
+            checks += 1
+            if not pattern.match(value.replace(' ', '').upper()):
+                problems.append(f"format:{field}")
+
+    for base in BILINGUAL_PAIRS:
+        fr_field, ar_field = f"{base}_fr", f"{base}_ar"
+        if fr_field not in data or ar_field not in data:
+            continue
+        fr_value, ar_value = data.get(fr_field), data.get(ar_field)
+        if not fr_value and not ar_value:
+            continue
+        checks += 1
+        if not fr_value or not ar_value:
+            problems.append(f"pair:{base}")
+        elif not LATIN_SCRIPT.search(fr_value) or not ARABIC_SCRIPT.search(ar_value):
+            problems.append(f"script:{base}")
+
+    if not checks:
+        return 1.0, problems
+    return (checks - len(problems)) / checks, problems
+
+
+def accept_fast_result(document_type, data, min_score):
+    """
+    Decides whether the fast model's result is kept, recording the outcome.
+    Returns True to keep it, False to escalate to the large model.
+    """
+    if data is None:
+        return record_escalation(document_type, 'fast_error')
+
+    score, problems = score_extraction(document_type, data)
+    if any(problem.startswith('missing:') for problem in problems):
+        return record_escalation(document_type, 'missing_required', score, problems)
+    if score < min_score:
+        return record_escalation(document_type, 'low_score', score, problems)
+
+    metrics.incr(f"cascade.{document_type}.fast_accepted")
+    return True
+
+
+def record_escalation(document_type, reason, score=None, problems=None):
+    """Counts an escalation (per document type and reason); always returns False"""
+    metrics.incr(f"cascade.{document_type}.escalated")
+    metrics.incr(f"cascade.{document_type}.escalated.{reason}")
+    details = f" (score {score:.2f}: {', '.join(problems)})" if score is not None else ''
+    print(f"⤴ Cascade: escalating {document_type} to the large model, {reason}{details}")
+    return False
+
+
+def get_cascade_stats():
+    """Escalation rate per document type, from the shared counters"""
+    counters = metrics.get_counters(prefix='cascade.')
+    document_types = sorted({name.split('.')[1] for name in counters})
+    stats = {}
+    for document_type in document_types:
+        accepted = counters.get(f"cascade.{document_type}.fast_accepted", 0)
+        escalated = counters.get(f"cascade.{document_type}.escalated", 0)
+        total = accepted + escalated
+        stats[document_type] = {
+            'fast_accepted': accepted,
+            'escalated': escalated,
+            'escalation_rate': round(escalated / total, 4) if total else None,
+            'reasons': {
+                reason: counters.get(f"cascade.{document_type}.escalated.{reason}", 0)
+                for reason in CASCADE_REASONS
+            },
+        }
+    return stats
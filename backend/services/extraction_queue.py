@@ -0,0 +1,203 @@
+# backend/services/extraction_queue.py
+"""
+Extraction queues: an 'interactive' and a 'bulk' Celery queue, with per-tenant
+fair share for bulk work.
+- create_document sends a user's first EXTRACTION_INTERACTIVE_BURST uploads
+  of a EXTRACTION_INTERACTIVE_WINDOW straight to the interactive queue;
+  beyond that (a bulk upload) and for re-extraction jobs documents go to the
+  bulk lane.
+- Bulk documents wait in one Redis list per tenant (user or re-extraction
+  job). A feeder takes them round-robin across tenants and only keeps
+  EXTRACTION_BULK_MAX_IN_FLIGHT of them in the Celery bulk queue, so a
+  2,000-document backlog never sits in front of anyone else's work.
+Slots are freed when a bulk task finishes (which feeds the next documents);
+slots of crashed workers expire after EXTRACTION_BULK_SLOT_TIMEOUT seconds.
+"""
+import time
+from flask import current_app
+from services import metrics
+from services.redis_client import get_redis
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+RING_KEY = 'extraction_queue:tenants'  # round-robin ring of tenants with waiting documents
+IN_FLIGHT_KEY = 'extraction_queue:in_flight'  # bulk document id -> dispatch time
+TENANT_KEY_PREFIX = 'extraction_queue:tenant:'  # waiting document ids, per tenant
+RECENT_KEY_PREFIX = 'extraction_queue:recent:'  # uploads per user in the current window
+
+# KEYS: tenant list, ring; ARGV: tenant, document ids...
+ENQUEUE_SCRIPT = """
+local length = redis.call('RPUSH', KEYS[1], unpack(ARGV, 2))
+if length == #ARGV - 1 then
+    -- The tenant had nothing waiting: it joins the end of the ring
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+end
+return length
+"""
+
+# KEYS: ring, in-flight set; ARGV: now, max in flight, stale before, tenant key prefix
+# (tenant lists are derived from the ring, so this needs a non-cluster Redis)
+FEED_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3])
+local free = tonumber(ARGV[2]) - redis.call('ZCARD', KEYS[2])
+local dispatched = {}
+while free > 0 do
+    local tenant = redis.call('LPOP', KEYS[1])
+    if not tenant then
+        break
+    end
+    local tenant_key = ARGV[4] .. tenant
+    local document_id = redis.call('LPOP', tenant_key)
+    if document_id then
+        redis.call('ZADD', KEYS[2], ARGV[1], document_id)
+        table.insert(dispatched, tenant)
+        table.insert(dispatched, document_id)
+        free = free - 1
+    end
+    if redis.call('LLEN', tenant_key) > 0 then
+        -- One document per turn: back to the end of the ring
+        redis.call('RPUSH', KEYS[1], tenant)
+    end
+end
+return dispatched
+"""
+
+_scripts = {}
+
+
+def _script(name, source):
+    r = get_redis()
+    key = (id(r), name)
+    script = _scripts.get(key)
+    if script is None:
+        script = r.register_script(source)
+        _scripts[key] = script
+    return script
+
+
+def _send(document_id, lane):
+    # Imported here: task.py imports the services package at module load
+    from task import run_ai_extraction
+    run_ai_extraction.apply_async(args=[document_id], kwargs={'lane': lane}, queue=lane)
+
+
+def choose_lane(user_id):
+    """'interactive' for a user's first uploads of the window, 'bulk' after that"""
+    config = current_app.config
+    key = f"{RECENT_KEY_PREFIX}{user_id}"
+    try:
+        r = get_redis()
+        count = r.incr(key)
+        if count == 1:
+            r.expire(key, config.get('EXTRACTION_INTERACTIVE_WINDOW', 60))
+    except Exception as e:
+        print(f"⚠ Lane selection failed, using the interactive queue: {e}")
+        return INTERACTIVE
+    return INTERACTIVE if count <= config.get('EXTRACTION_INTERACTIVE_BURST', 5) else BULK
+
+
+def enqueue_extraction(document_ids, tenant, lane):
+    """
+    Queues the extraction of documents: interactive ones go to Celery at
+    once, bulk ones wait in the tenant's fair-share list.
+    """
+    if isinstance(document_ids, str):
+        document_ids = [document_ids]
+    if not document_ids:
+        return
+    if lane == INTERACTIVE:
+        for document_id in document_ids:
+            _send(document_id, INTERACTIVE)
+        metrics.incr('extraction_queue.interactive', len(document_ids))
+        return
+
+    try:
+        _script('enqueue', ENQUEUE_SCRIPT)(
+            keys=[f"{TENANT_KEY_PREFIX}{tenant}", RING_KEY], args=[tenant, *document_ids]
+        )
+    except Exception as e:
+        # Without Redis there is no fair share: fall back to the plain bulk queue
+        print(f"⚠ Fair-share queue unavailable, sending to the bulk queue: {e}")
+        for document_id in document_ids:
+            _send(document_id, BULK)
+        return
+    metrics.incr('extraction_queue.bulk', len(document_ids))
+    feed_bulk_queue()
+
+
+def feed_bulk_queue():
+    """Moves waiting bulk documents into the Celery bulk queue, round-robin across tenants"""
+    config = current_app.config
+    now = time.time()
+    try:
+        dispatched = _script('feed', FEED_SCRIPT)(
+            keys=[RING_KEY, IN_FLIGHT_KEY],
+            args=[now, config.get('EXTRACTION_BULK_MAX_IN_FLIGHT', 32),
+                  now - config.get('EXTRACTION_BULK_SLOT_TIMEOUT', 900), TENANT_KEY_PREFIX]
+        )
+    except Exception as e:
+        print(f"⚠ Bulk queue feeder failed: {e}")
+        return 0
+    for index in range(0, len(dispatched), 2):
+        tenant, document_id = (value.decode('utf-8') for value in dispatched[index:index + 2])
+        try:
+            _send(document_id, BULK)
+        except Exception as e:
+            # The slot was taken by the script: give it back with the document
+            # (and the ones after it), which wait again in their tenant lists
+            print(f"⚠ Failed to send bulk document {document_id}, requeued: {e}")
+            _requeue(dispatched[index:])
+            return index // 2
+    return len(dispatched) // 2
+
+
+def _requeue(dispatched):
+    """Frees the slots of dispatched (tenant, document id) pairs and puts the documents back"""
+    try:
+        r = get_redis()
+        r.zrem(IN_FLIGHT_KEY, *dispatched[1::2])
+        for index in range(0, len(dispatched), 2):
+            tenant = dispatched[index].decode('utf-8')
+            _script('enqueue', ENQUEUE_SCRIPT)(
+                keys=[f"{TENANT_KEY_PREFIX}{tenant}", RING_KEY], args=[tenant, dispatched[index + 1]]
+            )
+    except Exception as e:
+        print(f"⚠ Failed to requeue bulk documents: {e}")
+
+
+def refresh_bulk_slot(document_id, delay=0):
+    """
+    Called when a bulk extraction is deferred (retried after delay seconds):
+    its slot is kept, dated from the retry, so the feeder does not see it as
+    lost after EXTRACTION_BULK_SLOT_TIMEOUT and over-dispatch.
+    """
+    try:
+        get_redis().zadd(IN_FLIGHT_KEY, {document_id: time.time() + delay}, xx=True)
+    except Exception as e:
+        print(f"⚠ Failed to refresh bulk slot of {document_id}: {e}")
+
+
+def release_bulk_slot(document_id):
+    """Called when a bulk extraction finishes: frees its slot and feeds the next document"""
+    try:
+        get_redis().zrem(IN_FLIGHT_KEY, document_id)
+    except Exception as e:
+        print(f"⚠ Failed to release bulk slot of {document_id}: {e}")
+    feed_bulk_queue()
+
+
+def get_queue_stats():
+    """Bulk backlog per tenant and the number of bulk documents in flight"""
+    r = get_redis()
+    tenants = [tenant.decode('utf-8') for tenant in r.lrange(RING_KEY, 0, -1)]
+    pipe = r.pipeline(transaction=False)
+    for tenant in tenants:
+        pipe.llen(f"{TENANT_KEY_PREFIX}{tenant}")
+    backlog = dict(zip(tenants, pipe.execute()))
+    return {
+        'bulk_in_flight': r.zcard(IN_FLIGHT_KEY),
+        'bulk_waiting': sum(backlog.values()),
+        'tenants': backlog,
+        'counters': metrics.get_counters(prefix='extraction_queue.'),
+    }
@@ -0,0 +1,176 @@
+# backend/services/idempotency.py
+"""
+Duplicate suppression for uploads and extraction tasks (Redis).
+- Idempotency-Key: an upload retried with the same key (client retry,
+  double-click) returns the document created by the first request instead
+  of creating and extracting a second one. Keys are scoped per user and kept
+  for IDEMPOTENCY_KEY_TTL seconds.
+- Extraction lock: run_ai_extraction holds a per-document lease while it
+  runs, renewed in the background, so a redelivered or duplicated task never
+  calls the model for a document that is already being extracted.
+Deduplicated requests and tasks are counted in services.metrics (dedup.*).
+"""
+import hashlib
+import threading
+import uuid
+from flask import current_app
+from services import metrics
+from services.redis_client import get_redis
+
+IDEMPOTENCY_KEY_PREFIX = 'idempotency:'
+LOCK_KEY_PREFIX = 'extraction_lock:'
+MAX_KEY_LENGTH = 255
+PENDING = 'pending'
+
+# Extend / delete the lease only if we still own it
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class IdempotencyConflict(Exception):
+    """The key is in use by a request still in progress, or by different content"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# --- Idempotency-Key for uploads ---
+def _idempotency_key(user_id, key):
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return f"{IDEMPOTENCY_KEY_PREFIX}{user_id}:{digest}"
+
+
+def begin_request(user_id, key, fingerprint):
+    """
+    Claims an Idempotency-Key for a new upload.
+    Returns None when the request should proceed, or the id of the document
+    an earlier request with the same key created (replay).
+    Raises IdempotencyConflict (409 in progress, 422 different content).
+    Redis errors never block uploads (the key is then ignored).
+    """
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyConflict(f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters', 400)
+
+    redis_key = _idempotency_key(user_id, key)
+    ttl = current_app.config.get('IDEMPOTENCY_KEY_TTL', 24 * 3600)
+    try:
+        r = get_redis()
+        if r.set(redis_key, f"{PENDING}|{fingerprint}", nx=True, ex=ttl):
+            return None
+        existing = r.get(redis_key)
+    except Exception as e:
+        print(f"⚠ Idempotency check failed (processing the upload): {e}")
+        return None
+    if existing is None:
+        # Expired (or released after a failure) in between: treat as new
+        return begin_request(user_id, key, fingerprint)
+
+    state, _, stored_fingerprint = existing.decode('utf-8').partition('|')
+    if stored_fingerprint != fingerprint:
+        metrics.incr('dedup.upload_key_mismatch')
+        raise IdempotencyConflict('Idempotency-Key was already used for a different upload', 422)
+    if state == PENDING:
+        metrics.incr('dedup.upload_in_progress')
+        raise IdempotencyConflict('A request with this Idempotency-Key is still in progress', 409)
+    metrics.incr('dedup.upload_replayed')
+    return state
+
+
+def complete_request(user_id, key, fingerprint, document_id):
+    """Records the document created for the key (replayed by later retries)"""
+    if not key:
+        return
+    ttl = current_app.config.get('IDEMPOTENCY_KEY_TTL', 24 * 3600)
+    try:
+        get_redis().set(_idempotency_key(user_id, key), f"{document_id}|{fingerprint}", ex=ttl)
+    except Exception as e:
+        print(f"⚠ Failed to record Idempotency-Key result: {e}")
+
+
+def abort_request(user_id, key):
+    """Frees the key after a failed upload, so the client can retry with it"""
+    if not key:
+        return
+    try:
+        get_redis().delete(_idempotency_key(user_id, key))
+    except Exception as e:
+        print(f"⚠ Failed to release Idempotency-Key: {e}")
+
+
+def forget_replay(user_id, key, fingerprint, document_id):
+    """
+    Drops a key whose document was deleted, so the upload can run again.
+    Only if it still points at that document: a concurrent retry may already
+    have claimed the key again.
+    """
+    if not key:
+        return
+    try:
+        get_redis().eval(RELEASE_SCRIPT, 1, _idempotency_key(user_id, key), f"{document_id}|{fingerprint}")
+    except Exception as e:
+        print(f"⚠ Failed to release Idempotency-Key: {e}")
+
+
+# --- Per-document extraction lock with lease renewal ---
+class ExtractionLock:
+    """
+    Lease on one document: SET NX PX, renewed every lease/3 by a daemon
+    thread while held, released only by its owner (token check in Lua).
+    If the process dies the lease simply expires.
+    """
+
+    def __init__(self, document_id):
+        self.key = f"{LOCK_KEY_PREFIX}{document_id}"
+        self.token = uuid.uuid4().hex
+        self.lease_ms = int(current_app.config.get('EXTRACTION_LOCK_LEASE', 60) * 1000)
+        self._redis = None
+        self._stop = threading.Event()
+        self._renewer = None
+
+    def acquire(self):
+        """Returns True when the lease was taken (also when Redis is unavailable: fail open)"""
+        try:
+            self._redis = get_redis()
+            acquired = self._redis.set(self.key, self.token, nx=True, px=self.lease_ms)
+        except Exception as e:
+            print(f"⚠ Extraction lock unavailable (running without it): {e}")
+            self._redis = None
+            return True
+        if not acquired:
+            metrics.incr('dedup.extraction_locked')
+            return False
+        self._renewer = threading.Thread(target=self._renew, name='extraction-lock-renewer', daemon=True)
+        self._renewer.start()
+        return True
+
+    def _renew(self):
+        # The client was captured at acquire time: no app context needed here
+        while not self._stop.wait(self.lease_ms / 3000.0):
+            try:
+                if not self._redis.eval(RENEW_SCRIPT, 1, self.key, self.token, self.lease_ms):
+                    print(f"⚠ Lost extraction lease {self.key}")
+                    return
+            except Exception as e:
+                print(f"⚠ Extraction lease renewal failed: {e}")
+
+    def release(self):
+        self._stop.set()
+        if self._redis is None:
+            return
+        try:
+            self._redis.eval(RELEASE_SCRIPT, 1, self.key, self.token)
+        except Exception as e:
+            print(f"⚠ Failed to release extraction lease {self.key}: {e}")
@@ -0,0 +1,154 @@
+# backend/services/image_processor.py
+"""
+Image normalization applied before storage and the model call.
+Decodes the upload, applies the EXIF orientation, trims the background around
+the card, downscales to IMAGE_MAX_EDGE and re-encodes to a compact JPEG/WebP.
+Pillow is optional: without it (or for files it cannot decode) the original
+bytes are kept as they are. Runs on the workers for staged uploads; sync
+uploads keep their original bytes.
+"""
+import os
+import tempfile
+from collections import namedtuple
+from flask import current_app
+
+try:
+    from PIL import Image, ImageChops, ImageOps
+except ImportError:  # Pillow not installed: normalization is skipped
+    Image = None
+
+if Image is not None:
+    try:
+        # HEIC/HEIF (iPhone photos) need the pillow-heif plugin
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+    except ImportError:
+        pass
+
+# stream is rewound and ready to be uploaded; sizes are in bytes
+NormalizedImage = namedtuple(
+    'NormalizedImage',
+    ['stream', 'filename', 'content_type', 'original_size', 'stored_size']
+)
+
+OUTPUT_FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'WEBP': ('webp', 'image/webp'),
+}
+# Normalized output above this size is spilled to a temporary file
+SPOOL_MAX_MEMORY = 2 * 1024 * 1024
+
+
+def _stream_size(stream):
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def _passthrough(stream, filename, content_type, size):
+    stream.seek(0)
+    return NormalizedImage(stream, filename, content_type, size, size)
+
+
+def keep_original(stream, filename, content_type=None):
+    """NormalizedImage of the unchanged upload (sync uploads, stored inside the request)"""
+    return _passthrough(stream, filename, content_type, _stream_size(stream))
+
+
+def _crop_to_card(image):
+    """
+    Trims a uniform background around the document (e.g. a table behind the
+    card). Conservative: the crop is only applied when the detected content
+    is clearly smaller than the frame but still a large part of it.
+    """
+    # Work on a small grayscale copy, compared against the top-left corner color
+    preview = image.convert('L')
+    preview.thumbnail((256, 256))
+    background = Image.new('L', preview.size, preview.getpixel((0, 0)))
+    mask = ImageChops.difference(preview, background).point(lambda value: 255 if value > 40 else 0)
+    bbox = mask.getbbox()
+    if not bbox:
+        return image
+
+    box_area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+    ratio = box_area / float(preview.size[0] * preview.size[1])
+    if ratio < 0.2 or ratio > 0.9:
+        return image
+
+    # Scale the box back to full resolution, with a small margin
+    scale_x = image.size[0] / preview.size[0]
+    scale_y = image.size[1] / preview.size[1]
+    margin = 0.02 * max(image.size)
+    return image.crop((
+        max(int(bbox[0] * scale_x - margin), 0),
+        max(int(bbox[1] * scale_y - margin), 0),
+        min(int(bbox[2] * scale_x + margin), image.size[0]),
+        min(int(bbox[3] * scale_y + margin), image.size[1]),
+    ))
+
+
+def _flatten(image):
+    """RGB version of the image; transparent areas become white, not black"""
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def is_normalization_enabled():
+    """True when uploads are decoded and re-encoded (Pillow installed and enabled)"""
+    return Image is not None and current_app.config.get('IMAGE_NORMALIZE_ENABLED', True)
+
+
+def normalize_image(stream, filename, content_type=None):
+    """
+    Returns a NormalizedImage for an uploaded image stream.
+    Never raises: on any decoding problem the original stream is returned.
+    CPU bound: called from the workers (push_staged_upload), not the API.
+    """
+    original_size = _stream_size(stream)
+    config = current_app.config
+    if not is_normalization_enabled():
+        return _passthrough(stream, filename, content_type, original_size)
+
+    max_edge = config.get('IMAGE_MAX_EDGE', 2048)
+    output_format = config.get('IMAGE_OUTPUT_FORMAT', 'JPEG').upper()
+    extension, output_content_type = OUTPUT_FORMATS.get(output_format, OUTPUT_FORMATS['JPEG'])
+    # Refuse decompression bombs before any pixel is decoded
+    Image.MAX_IMAGE_PIXELS = config.get('IMAGE_MAX_PIXELS', 50_000_000)
+
+    try:
+        image = Image.open(stream)
+        source_format = image.format
+        source_size = image.size
+        # JPEG only: decode directly at a reduced scale (bounded memory)
+        image.draft('RGB', (max_edge, max_edge))
+        rotated = image.getexif().get(0x0112, 1) != 1  # EXIF Orientation tag
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L') or 'transparency' in image.info:
+            image = _flatten(image)
+        if config.get('IMAGE_CROP_ENABLED', True):
+            image = _crop_to_card(image)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        # Any crop or downscale changes the size (a 180° rotation does not)
+        changed = rotated or image.size != source_size
+
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        image.save(output, format=output_format,
+                   quality=config.get('IMAGE_QUALITY', 85), optimize=True)
+        stored_size = _stream_size(output)
+    except Exception as e:
+        print(f"⚠ Image normalization skipped for {filename}: {e}")
+        return _passthrough(stream, filename, content_type, original_size)
+
+    if stored_size >= original_size and not changed and source_format in OUTPUT_FORMATS:
+        # Already a compact format and nothing was gained: keep the original
+        output.close()
+        return _passthrough(stream, filename, content_type, original_size)
+
+    base_name = os.path.splitext(filename or 'upload')[0]
+    print(f"🖼 Normalized {filename}: {original_size} -> {stored_size} bytes ({image.size[0]}x{image.size[1]})")
+    return NormalizedImage(output, f"{base_name}.{extension}", output_content_type, original_size, stored_size)
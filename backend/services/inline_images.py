@@ -0,0 +1,91 @@
+# backend/services/inline_images.py
+"""
+Inline image mode for the model call.
+With EXTRACTION_IMAGE_MODE=inline the (already normalized) image bytes kept
+from the upload are embedded as data URIs in the image_url payload, so the
+model provider does not have to fetch them from storage first. Bytes are
+kept for INLINE_IMAGE_CACHE_TTL seconds, keyed by the storage URL, in the
+dedicated INLINE_IMAGE_REDIS_URL instance: a bounded cache (maxmemory with
+allkeys-lru, see docker-compose.yml), so image bytes never fill the Celery
+broker. Without it nothing is kept (the local storage backend can always
+provide the bytes); images above INLINE_IMAGE_MAX_BYTES, or no longer
+available, are sent by URL.
+"""
+import base64
+import hashlib
+import mimetypes
+from flask import current_app
+from services.redis_client import get_redis
+from services.storage import get_storage
+
+KEY_PREFIX = 'inline_image:'
+DEFAULT_CONTENT_TYPE = 'image/jpeg'
+
+
+def _key(url):
+    return KEY_PREFIX + hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _is_inline_mode():
+    return current_app.config.get('EXTRACTION_IMAGE_MODE', 'url') == 'inline'
+
+
+def remember_image(url, stream, content_type=None, filename=None):
+    """Keeps the uploaded bytes of `url` for the inline mode (errors are logged, never raised)"""
+    if not url or stream is None or not _is_inline_mode():
+        return
+    if not current_app.config.get('INLINE_IMAGE_REDIS_URL'):
+        return
+    max_bytes = current_app.config.get('INLINE_IMAGE_MAX_BYTES', 4 * 1024 * 1024)
+    try:
+        stream.seek(0)
+        data = stream.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            return  # Too large to inline: the model will fetch the URL
+        content_type = content_type or mimetypes.guess_type(filename or url)[0] or DEFAULT_CONTENT_TYPE
+        pipe = get_redis('INLINE_IMAGE_REDIS_URL').pipeline()
+        pipe.hset(_key(url), mapping={'content_type': content_type, 'data': data})
+        pipe.expire(_key(url), current_app.config.get('INLINE_IMAGE_CACHE_TTL', 3600))
+        pipe.execute()
+    except Exception as e:
+        print(f"⚠ Failed to keep image bytes for inline mode: {e}")
+
+
+def remember_uploads(urls, images):
+    """remember_image for each (storage URL, NormalizedImage) pair of an upload"""
+    for url, image in zip(urls, images):
+        if image is not None:
+            remember_image(url, image.stream, image.content_type, image.filename)
+
+
+def _url_payload(url):
+    # The model provider fetches the (signed) URL itself
+    return (get_storage().signed_url(url) if url else url), 'url'
+
+
+def image_payload_url(url):
+    """
+    Returns (url_for_the_model, mode): a data URI and 'inline' when the bytes
+    are available and small enough, otherwise the signed URL and 'url'.
+    """
+    if not url or not _is_inline_mode():
+        return _url_payload(url)
+    cached = {}
+    try:
+        r = get_redis('INLINE_IMAGE_REDIS_URL')
+        if r is not None:
+            cached = r.hgetall(_key(url))
+    except Exception as e:
+        print(f"⚠ Inline image lookup failed: {e}")
+
+    max_bytes = current_app.config.get('INLINE_IMAGE_MAX_BYTES', 4 * 1024 * 1024)
+    data = cached.get(b'data')
+    if data:
+        content_type = cached.get(b'content_type', DEFAULT_CONTENT_TYPE.encode()).decode('ascii')
+    else:
+        # Not kept (expired, re-extraction): the local storage backend has the bytes
+        data = get_storage().read_bytes(url, max_bytes)
+        content_type = mimetypes.guess_type(url)[0] or DEFAULT_CONTENT_TYPE
+    if not data or len(data) > max_bytes:
+        return _url_payload(url)
+    return f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}", 'inline'
@@ -0,0 +1,74 @@
+# backend/services/json_provider.py
+"""
+JSON provider of the Flask app (jsonify, request.get_json).
+With orjson installed (and FAST_JSON_ENABLED) responses are encoded by orjson,
+which serializes datetimes natively and writes bytes straight into the
+response; otherwise the standard library encoder is used. Both handle
+ObjectId and encode datetimes as ISO 8601, so serializers can hand over
+datetime and ObjectId values (e.g. raw pymongo documents) without converting
+them first.
+"""
+from datetime import date, datetime
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson not installed: the standard encoder is used
+    orjson = None
+
+
+def _default(obj):
+    """Types neither encoder knows about"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return DefaultJSONProvider.default(obj)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Standard library encoder; datetimes as ISO 8601 instead of HTTP dates"""
+
+    default = staticmethod(_default)
+
+
+class OrjsonProvider(JSONProvider):
+    """orjson encoder; falls back to the standard one for options it does not support"""
+
+    def _options(self, indent=None):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def _dumpb(self, obj, indent=None):
+        return orjson.dumps(obj, default=_default, option=self._options(indent))
+
+    def dumps(self, obj, **kwargs):
+        if set(kwargs) - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        return self._dumpb(obj, kwargs.get('indent')).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Same as DefaultJSONProvider.response, without the bytes -> str -> bytes round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._dumpb(obj, indent) + b"\n", mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """Installs the fastest available provider on the app"""
+    if orjson is not None and app.config.get('FAST_JSON_ENABLED', True):
+        app.json = OrjsonProvider(app)
+        print("✓ JSON responses encoded with orjson")
+    else:
+        app.json = JSONProvider(app)
+    return app.json
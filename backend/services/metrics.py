@@ -0,0 +1,87 @@
+# backend/services/metrics.py
+"""
+Lightweight Redis-backed metrics shared by the API and the Celery workers.
+Counters live in a single hash so every process sees the same totals;
+gauges are per-process JSON snapshots that expire when the process goes away.
+Metrics must never break the request path, so Redis errors are swallowed.
+"""
+import json
+from services.redis_client import get_redis
+
+COUNTERS_KEY = 'metrics:counters'
+GAUGES_KEY_PREFIX = 'metrics:gauges:'
+
+
+def incr(name, amount=1):
+    """Increments a shared counter"""
+    try:
+        get_redis().hincrby(COUNTERS_KEY, name, amount)
+    except Exception as e:
+        print(f"⚠ Metrics: failed to increment {name}: {e}")
+
+
+# Upper bounds (ms) of the latency histogram buckets used by observe()
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+def observe(name, milliseconds):
+    """
+    Records one latency sample as shared counters: <name>.count, <name>.sum_ms
+    and one histogram bucket <name>.le_<bound>ms (or <name>.le_inf)
+    """
+    bucket = next((f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS if milliseconds <= bound), 'le_inf')
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(COUNTERS_KEY, f"{name}.count", 1)
+        pipe.hincrby(COUNTERS_KEY, f"{name}.sum_ms", int(round(milliseconds)))
+        pipe.hincrby(COUNTERS_KEY, f"{name}.{bucket}", 1)
+        pipe.execute()
+    except Exception as e:
+        print(f"⚠ Metrics: failed to record {name}: {e}")
+
+
+def get_counters(prefix=None):
+    """Returns all counters (optionally only those starting with prefix)"""
+    try:
+        raw = get_redis().hgetall(COUNTERS_KEY)
+    except Exception as e:
+        print(f"⚠ Metrics: failed to read counters: {e}")
+        return {}
+
+    counters = {}
+    for key, value in raw.items():
+        name = key.decode('utf-8')
+        if prefix and not name.startswith(prefix):
+            continue
+        counters[name] = int(value)
+    return counters
+
+
+def set_gauges(scope, values, ttl=120):
+    """Stores a snapshot of point-in-time values (e.g. pool usage) for one process"""
+    try:
+        get_redis().set(GAUGES_KEY_PREFIX + scope, json.dumps(values), ex=ttl)
+    except Exception as e:
+        print(f"⚠ Metrics: failed to publish gauges {scope}: {e}")
+
+
+def get_gauges(prefix=''):
+    """Returns every live gauge snapshot whose scope starts with prefix"""
+    gauges = {}
+    try:
+        r = get_redis()
+        for key in r.scan_iter(match=f"{GAUGES_KEY_PREFIX}{prefix}*", count=500):
+            raw = r.get(key)
+            if raw is not None:
+                gauges[key.decode('utf-8')[len(GAUGES_KEY_PREFIX):]] = json.loads(raw)
+    except Exception as e:
+        print(f"⚠ Metrics: failed to read gauges: {e}")
+    return gauges
+
+
+def snapshot():
+    """All counters and live gauges, for the admin metrics endpoint"""
+    return {
+        'counters': get_counters(),
+        'gauges': get_gauges(),
+    }
@@ -0,0 +1,153 @@
+# backend/services/openai_client.py
+"""
+Process-level OpenAI client registry.
+Clients are created lazily on first use (so after Celery has forked) and are
+keyed by base URL and API key, so every task in a worker process reuses the
+same keep-alive HTTP connection pool instead of paying a TLS handshake.
+"""
+import hashlib
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+import httpx
+from openai import OpenAI
+from flask import current_app
+from services import metrics
+
+_lock = threading.Lock()
+_clients = {}
+_last_published = 0.0
+
+
+class PooledClient:
+    """An OpenAI client plus the bookkeeping needed for pool-utilization metrics"""
+
+    def __init__(self, api_key, base_url, limits, timeout, max_retries):
+        self.base_url = base_url
+        self.max_connections = limits.max_connections
+        self.max_keepalive_connections = limits.max_keepalive_connections
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_client,
+            max_retries=max_retries
+        )
+        self.created_at = time.time()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_calls = 0
+        self.failed_calls = 0
+        self._stats_lock = threading.Lock()
+
+    @contextmanager
+    def track(self):
+        """Wraps one model call so in-flight / peak / total counters stay accurate"""
+        with self._stats_lock:
+            self.in_flight += 1
+            self.total_calls += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield self.client
+        except Exception:
+            with self._stats_lock:
+                self.failed_calls += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self.in_flight -= 1
+            _publish_pool_stats()
+
+    def connection_stats(self):
+        """
+        Reads open/idle connection counts from the underlying httpcore pool.
+        These are private attributes, so any missing piece just yields None.
+        """
+        try:
+            pool = self.http_client._transport._pool
+            connections = list(pool.connections)
+            return len(connections), sum(1 for c in connections if c.is_idle())
+        except Exception:
+            return None, None
+
+    def stats(self):
+        open_connections, idle_connections = self.connection_stats()
+        return {
+            'base_url': self.base_url,
+            'max_connections': self.max_connections,
+            'max_keepalive_connections': self.max_keepalive_connections,
+            'open_connections': open_connections,
+            'idle_connections': idle_connections,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'utilization': round(self.in_flight / self.max_connections, 4) if self.max_connections else None,
+            'peak_utilization': round(self.peak_in_flight / self.max_connections, 4) if self.max_connections else None,
+            'total_calls': self.total_calls,
+            'failed_calls': self.failed_calls,
+        }
+
+
+def _registry_key(api_key, base_url):
+    key_fingerprint = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+    return (os.getpid(), base_url, key_fingerprint)
+
+
+def get_pooled_client(api_key, base_url):
+    """Returns the process-wide PooledClient for (base_url, api_key), creating it lazily"""
+    return _get_or_create(_registry_key(api_key, base_url), api_key, base_url)
+
+
+def _get_or_create(key, api_key, base_url):
+    pooled = _clients.get(key)
+    if pooled is not None:
+        return pooled
+
+    config = current_app.config
+    limits = httpx.Limits(
+        max_connections=config.get('OPENAI_MAX_CONNECTIONS', 20),
+        max_keepalive_connections=config.get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10),
+        keepalive_expiry=config.get('OPENAI_KEEPALIVE_EXPIRY', 60.0)
+    )
+    timeout = httpx.Timeout(
+        config.get('OPENAI_REQUEST_TIMEOUT', 120.0),
+        connect=config.get('OPENAI_CONNECT_TIMEOUT', 10.0)
+    )
+
+    with _lock:
+        pooled = _clients.get(key)
+        if pooled is None:
+            # Entries inherited from a parent process share its sockets: drop them
+            for stale_key in [k for k in _clients if k[0] != key[0]]:
+                _clients.pop(stale_key, None)
+            pooled = PooledClient(
+                api_key, base_url, limits, timeout,
+                max_retries=config.get('OPENAI_MAX_RETRIES', 2)
+            )
+            _clients[key] = pooled
+            print(f"🔌 Created OpenAI client pool for {base_url} (pid {key[0]})")
+    return pooled
+
+
+def get_pool_stats():
+    """Pool-utilization stats for every client created in this process"""
+    pid = os.getpid()
+    return [pooled.stats() for key, pooled in list(_clients.items()) if key[0] == pid]
+
+
+def _publish_pool_stats():
+    """Publishes this process' pool stats to Redis (at most every few seconds)"""
+    global _last_published
+    now = time.time()
+    if now - _last_published < 5:
+        return
+    _last_published = now
+    try:
+        ttl = current_app.config.get('METRICS_GAUGE_TTL', 120)
+    except RuntimeError:
+        # No app context (should not happen inside tasks): skip publishing
+        return
+    for stats in get_pool_stats():
+        scope = f"openai_pool:{socket.gethostname()}:{os.getpid()}:{stats['base_url']}"
+        metrics.set_gauges(scope, stats, ttl=ttl)
@@ -0,0 +1,72 @@
+# backend/services/pagination.py
+"""
+Keyset (cursor) pagination helpers for document listings.
+Pages are ordered by (created_at, _id) descending and the opaque `after`
+token encodes the last row of the previous page, so every page costs the
+same index range scan no matter how deep it is.
+"""
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from mongoengine.queryset.visitor import Q
+
+COUNT_MODES = ('exact', 'estimated', 'none')
+# Filtered "estimated" counts stop scanning here and report a lower bound
+ESTIMATE_CAP = 10000
+
+
+def encode_cursor(created_at, document_id):
+    payload = json.dumps({'t': created_at.isoformat(), 'id': str(document_id)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Returns (created_at, ObjectId) for an `after` token, or raises ValueError"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(payload['t']), ObjectId(payload['id'])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise ValueError('Invalid pagination cursor')
+
+
+def paginate_keyset(queryset, after, per_page):
+    """
+    Returns (items, next_cursor) for one page of queryset.
+    next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if after:
+        created_at, document_id = decode_cursor(after)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=document_id)
+        )
+
+    # One extra row tells us whether another page exists without a count()
+    items = list(queryset.limit(per_page + 1))
+    if len(items) <= per_page:
+        return items, None
+
+    items = items[:per_page]
+    last = items[-1]
+    if isinstance(last, dict):  # as_pymongo() rows
+        return items, encode_cursor(last['created_at'], last['_id'])
+    return items, encode_cursor(last.created_at, last.id)
+
+
+def count_documents(queryset, mode, filtered=True):
+    """
+    Returns (total, is_estimate) according to the requested count mode:
+    'exact' counts, 'estimated' uses collection metadata when unfiltered or a
+    capped count otherwise, 'none' skips counting and returns (None, False).
+    """
+    if mode == 'none':
+        return None, False
+    if mode == 'estimated':
+        if not filtered:
+            return queryset._document._get_collection().estimated_document_count(), True
+        capped = queryset.limit(ESTIMATE_CAP).count(with_limit_and_skip=True)
+        return capped, capped >= ESTIMATE_CAP
+    return queryset.count(), False
@@ -0,0 +1,142 @@
+# backend/services/rate_limiter.py
+"""
+Distributed token-bucket rate limiter for the model endpoints, shared by the
+API and every Celery worker through Redis (the broker).
+Each endpoint has two budgets: requests per minute and tokens per minute.
+A caller reserves one request and an estimate of its tokens in a single Lua
+script; buckets may go into debt, so the script returns how long the caller
+has to wait for its reservation. Callers are served in reservation order
+(fair, nobody is starved) and block instead of failing; the wait happens
+before the attempt's latency and hedge timers start. Hedged requests only
+reserve budget that is free right now (try_acquire), so hedges never pile up
+behind a throttle. Once the response is known the token estimate is
+corrected with the real usage.
+Wait times are exported through services.metrics (rate_limit.wait.<name>).
+"""
+import time
+from flask import current_app
+from services import metrics
+from services.redis_client import get_redis
+
+KEY_PREFIX = 'rate_limit:'
+
+# KEYS: requests bucket, tokens bucket
+# ARGV: requests per minute, tokens per minute, tokens reserved, only if free (0/1)
+# Returns the wait in milliseconds before the reservation is covered; with
+# "only if free" nothing is reserved unless the wait is 0
+RESERVE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local wait = 0
+local costs = {1, tonumber(ARGV[3])}
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local per_minute = tonumber(ARGV[i])
+    if per_minute > 0 then
+        local state = redis.call('HMGET', key, 'level', 'ts')
+        local level = tonumber(state[1]) or per_minute
+        local ts = tonumber(state[2]) or now
+        -- Refill since the last reservation, capped at one minute of budget
+        level = math.min(per_minute, level + (now - ts) * per_minute / 60000)
+        level = level - costs[i]
+        if level < 0 then
+            wait = math.max(wait, math.ceil(-level * 60000 / per_minute))
+        end
+        levels[i] = level
+    end
+end
+if wait > 0 and ARGV[4] == '1' then
+    return wait
+end
+for i, key in ipairs(KEYS) do
+    local level = levels[i]
+    if level then
+        local per_minute = tonumber(ARGV[i])
+        redis.call('HSET', key, 'level', tostring(level), 'ts', now)
+        redis.call('PEXPIRE', key, 120000 + math.ceil(-math.min(level, 0) * 60000 / per_minute))
+    end
+end
+return wait
+"""
+
+# KEYS: tokens bucket; ARGV: tokens to give back (negative = charge more)
+SETTLE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBYFLOAT', KEYS[1], 'level', ARGV[1])
+end
+return 1
+"""
+
+_scripts = {}
+
+
+def _script(name, source):
+    # Registered once per Redis client; redis-py runs it by SHA (EVALSHA)
+    r = get_redis()
+    key = (id(r), name)
+    script = _scripts.get(key)
+    if script is None:
+        script = r.register_script(source)
+        _scripts[key] = script
+    return script
+
+
+def _keys(name):
+    return [f"{KEY_PREFIX}{name}:requests", f"{KEY_PREFIX}{name}:tokens"]
+
+
+def reserve(name, rpm, tpm, tokens, only_if_free=False):
+    """
+    Reserves one request and `tokens` tokens of endpoint `name`.
+    Returns the seconds to wait before sending (0.0 when within budget).
+    only_if_free: reserve nothing when a wait would be needed (the wait is
+    still returned). Redis errors never block calls (fail open).
+    """
+    if not rpm and not tpm:
+        return 0.0
+    try:
+        wait_ms = _script('reserve', RESERVE_SCRIPT)(
+            keys=_keys(name), args=[rpm or 0, tpm or 0, tokens, 1 if only_if_free else 0]
+        )
+    except Exception as e:
+        print(f"⚠ Rate limiter unavailable (allowing the call): {e}")
+        return 0.0
+    if only_if_free:
+        return wait_ms / 1000.0
+    metrics.observe(f"rate_limit.wait.{name}", wait_ms)
+    if wait_ms:
+        metrics.incr(f"rate_limit.{name}.throttled")
+    return wait_ms / 1000.0
+
+
+def acquire(name, rpm, tpm, tokens):
+    """Blocks until a reservation is covered by the budgets"""
+    wait = reserve(name, rpm, tpm, tokens)
+    if wait > 0:
+        if wait > 5:
+            print(f"⏳ Rate limit '{name}': waiting {wait:.1f}s for budget")
+        time.sleep(wait)
+    return wait
+
+
+def try_acquire(name, rpm, tpm, tokens):
+    """Reserves only if the budgets cover it right now; True when reserved"""
+    return reserve(name, rpm, tpm, tokens, only_if_free=True) == 0
+
+
+def settle(name, tpm, reserved_tokens, response):
+    """Corrects the token reservation with the usage reported in the response"""
+    usage = getattr(response, 'usage', None)
+    used_tokens = getattr(usage, 'total_tokens', None)
+    if not tpm or used_tokens is None:
+        return
+    try:
+        _script('settle', SETTLE_SCRIPT)(keys=_keys(name)[1:], args=[reserved_tokens - used_tokens])
+    except Exception as e:
+        print(f"⚠ Rate limiter settle failed: {e}")
+
+
+def estimate_tokens(image_count):
+    """Tokens reserved before a call: prompt and answer plus a flat cost per image"""
+    config = current_app.config
+    return config.get('RATE_LIMIT_BASE_TOKENS', 1500) + image_count * config.get('RATE_LIMIT_TOKENS_PER_IMAGE', 1000)
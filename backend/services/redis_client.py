@@ -0,0 +1,29 @@
+# backend/services/redis_client.py
+import redis
+from flask import current_app
+
+# One client (and therefore one connection pool) per Redis URL per process.
+# redis-py resets its pool automatically after a fork, so this is safe to
+# share between the API and the Celery prefork/thread pools.
+_clients = {}
+
+
+def get_redis(url_setting='REDIS_URL'):
+    """
+    Returns the shared Redis client for the URL in config[url_setting]
+    (REDIS_URL by default), or None when that setting is empty.
+    Must be called inside a Flask app context (API request or Celery task).
+    """
+    url = current_app.config.get(url_setting)
+    if not url:
+        return None
+    client = _clients.get(url)
+    if client is None:
+        client = redis.Redis.from_url(
+            url,
+            socket_timeout=current_app.config.get('REDIS_SOCKET_TIMEOUT', 5.0),
+            socket_connect_timeout=current_app.config.get('REDIS_SOCKET_TIMEOUT', 5.0),
+            health_check_interval=30
+        )
+        _clients[url] = client
+    return client
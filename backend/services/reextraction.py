@@ -0,0 +1,226 @@
+# backend/services/reextraction.py
+"""
+Bulk re-extraction pipeline.
+Reads the documents matching a filter in _id order, one chunk per batch,
+enqueues each chunk and checkpoints the last enqueued id on the job, so a
+resumed run skips finished documents. Batches are paced by the rate limit
+(Celery countdown, or a sleep when run from the CLI).
+"""
+import time
+import uuid
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import current_app
+from mongoengine.queryset.visitor import Q
+from models.document import Document
+from models.reextraction_job import ReextractionJob
+from services.extraction_queue import BULK, enqueue_extraction
+
+VALID_TYPES = ['cin', 'driving_license', 'vehicle_registration']
+# Only finished documents: pending/processing ones belong to an extraction task
+VALID_STATUSES = list(Document.RESETTABLE_STATUSES)
+# User-confirmed data is never re-extracted unless explicitly requested
+DEFAULT_STATUSES = ['completed', 'failed']
+
+
+def _as_list(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(',') if v.strip()]
+    return list(value)
+
+
+def normalize_filters(data):
+    """
+    Validates raw filters (from the API or the CLI) and returns a clean dict.
+    Raises ValueError on invalid input.
+    """
+    document_types = _as_list(data.get('document_type'))
+    statuses = _as_list(data.get('status')) or list(DEFAULT_STATUSES)
+
+    invalid_types = [t for t in document_types if t not in VALID_TYPES]
+    if invalid_types:
+        raise ValueError(f'Invalid document_type: {", ".join(invalid_types)}')
+    invalid_statuses = [s for s in statuses if s not in VALID_STATUSES]
+    if invalid_statuses:
+        raise ValueError(f'Invalid status: {", ".join(invalid_statuses)}')
+
+    filters = {'document_type': document_types, 'status': statuses}
+    for key in ('date_from', 'date_to'):
+        if data.get(key):
+            try:
+                datetime.fromisoformat(str(data[key]))
+            except ValueError:
+                raise ValueError(f'{key} must be an ISO date (YYYY-MM-DD)')
+            filters[key] = str(data[key])
+    return filters
+
+
+def build_query(filters, after_id=None):
+    """Builds the raw Mongo filter for a job's filters (and checkpoint)"""
+    query = {}
+    if filters.get('document_type'):
+        query['document_type'] = {'$in': filters['document_type']}
+    if filters.get('status'):
+        query['status'] = {'$in': filters['status']}
+
+    created_at = {}
+    if filters.get('date_from'):
+        created_at['$gte'] = datetime.fromisoformat(filters['date_from'])
+    if filters.get('date_to'):
+        date_to = datetime.fromisoformat(filters['date_to'])
+        if len(filters['date_to']) == 10:
+            # Plain date: include the whole day
+            created_at['$lt'] = date_to + timedelta(days=1)
+        else:
+            created_at['$lte'] = date_to
+    if created_at:
+        query['created_at'] = created_at
+
+    if after_id:
+        query['_id'] = {'$gt': ObjectId(after_id)}
+    return query
+
+
+def count_matching(filters):
+    return Document._get_collection().count_documents(build_query(filters))
+
+
+def create_job(filters, chunk_size=500, rate_limit=20.0, created_by=None):
+    job = ReextractionJob(
+        filters=filters,
+        chunk_size=chunk_size,
+        rate_limit=rate_limit,
+        total=count_matching(filters),
+        created_by=created_by
+    )
+    job.save()
+    return job
+
+
+def _enqueue_chunk(job, document_ids):
+    # Extraction tasks only claim pending documents: reset the chunk first
+    # (documents that left the job's statuses meanwhile are skipped)
+    document_ids = Document.reset_to_pending(document_ids, job.filters.get('status') or DEFAULT_STATUSES)
+    # Bulk lane, with the job as its own fair-share tenant next to the users
+    enqueue_extraction(document_ids, f"reextraction:{job.id}", BULK)
+
+
+def _log_progress(job):
+    rate = job.throughput()
+    eta = job.eta_seconds()
+    print(f"🔁 Re-extraction {job.id}: {job.enqueued}/{job.total} enqueued "
+          f"({rate or 0:.1f} docs/s, ETA {f'{eta:.0f}s' if eta is not None else 'n/a'})")
+
+
+def _batch_interval(job):
+    """Seconds one chunk takes at the job's rate limit"""
+    if job.rate_limit and job.rate_limit > 0:
+        return job.chunk_size / job.rate_limit
+    return 0.0
+
+
+def stale_after(job):
+    """Seconds without a checkpoint after which a running job is considered dead"""
+    return max(current_app.config.get('REEXTRACTION_STALE_AFTER', 300), 3 * _batch_interval(job))
+
+
+def is_stale(job):
+    return (job.status == 'running'
+            and job.updated_at < datetime.utcnow() - timedelta(seconds=stale_after(job)))
+
+
+def start_run(job_id):
+    """
+    Claims a job for a new run and returns it (with its new run_token).
+    Returns None when the job is finished, cancelled or still running: a
+    running job can only be taken over once its heartbeat is stale.
+    """
+    job = ReextractionJob.objects(id=job_id).first()
+    if not job:
+        return None
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=stale_after(job))
+    # Conditional update: of two concurrent resumes only one gets the job
+    return ReextractionJob.objects(
+        Q(id=job.id) & (Q(status__in=['pending', 'failed'])
+                        | Q(status='running', updated_at__lt=stale_before))
+    ).modify(
+        set__status='running',
+        set__run_token=uuid.uuid4().hex,
+        set__updated_at=now,
+        unset__error_message=True,
+        new=True
+    )
+
+
+def run_batch(job_id, run_token):
+    """
+    Enqueues the next chunk of a job and checkpoints it.
+    Returns the delay in seconds before the next batch (rate limit), or None
+    when the job is done, cancelled or taken over by another run.
+    """
+    job = ReextractionJob.objects(id=job_id).first()
+    if not job or job.status != 'running' or job.run_token != run_token:
+        print(f"⏸ Re-extraction {job_id} stopped ({job.status if job else 'deleted'}).")
+        return None
+
+    current = ReextractionJob.objects(id=job.id, status='running', run_token=run_token)
+    try:
+        chunk = [str(raw['_id']) for raw in Document._get_collection().find(
+            build_query(job.filters, after_id=job.last_document_id),
+            projection={'_id': 1},
+            sort=[('_id', 1)],
+            limit=job.chunk_size
+        )]
+
+        if not chunk:
+            if current.update_one(set__status='completed', set__finished_at=datetime.utcnow(),
+                                  set__updated_at=datetime.utcnow()):
+                print(f"✅ Re-extraction {job_id} completed: {job.enqueued} documents enqueued.")
+            return None
+
+        started = time.monotonic()
+        _enqueue_chunk(job, chunk)
+        # Paced time counts towards the throughput, as the sleep did before
+        interval = max(time.monotonic() - started, len(chunk) / job.rate_limit if job.rate_limit > 0 else 0)
+        # Checkpoint (and heartbeat) only while this run still owns the job
+        if not current.update_one(
+            set__last_document_id=chunk[-1],
+            inc__enqueued=len(chunk),
+            inc__elapsed_seconds=interval,
+            set__updated_at=datetime.utcnow()
+        ):
+            print(f"⏸ Re-extraction {job_id} stopped after its last chunk.")
+            return None
+
+        job.reload()
+        _log_progress(job)
+        return interval - (time.monotonic() - started)
+
+    except Exception as e:
+        current.update_one(set__status='failed', set__error_message=str(e), set__updated_at=datetime.utcnow())
+        print(f"❌ Re-extraction {job_id} failed: {e}")
+        raise
+
+
+def run_job(job_id):
+    """
+    Runs a job to the end in this process (CLI); Celery runs each batch as its
+    own task instead (task.run_reextraction_job).
+    Safe to call again after an interruption: it resumes from the checkpoint.
+    """
+    job = start_run(job_id)
+    if not job:
+        job = ReextractionJob.objects.get(id=job_id)
+        print(f"ℹ Re-extraction {job_id} is {job.status}, not starting another run.")
+        return job
+
+    while True:
+        delay = run_batch(job_id, job.run_token)
+        if delay is None:
+            break
+        if delay > 0:
+            time.sleep(delay)
+    return ReextractionJob.objects.get(id=job_id)
@@ -0,0 +1,364 @@
+# backend/services/resilience.py
+"""
+Resilience layer around the model call.
+- Retries transient provider errors with full-jitter exponential backoff.
+- Hedges: when an attempt is slower than the recent p95 latency of its
+  endpoint, a second identical request is sent and whichever succeeds first wins.
+- Circuit breaker shared by every process through Redis: after
+  CIRCUIT_FAILURE_THRESHOLD transient failures within CIRCUIT_FAILURE_WINDOW
+  seconds, calls are rejected with CircuitOpenError for CIRCUIT_COOLDOWN
+  seconds (the Celery task then defers the document instead of failing it).
+  After the cooldown a single probe call is let through; the others keep
+  being rejected until it succeeds (closed) or fails (open again).
+- In-flight bound: at most EXTRACTION_MAX_IN_FLIGHT requests per process
+  (hedges included). A call that gets no slot in time is deferred
+  (InFlightLimitError, handled like an open circuit).
+- Deadline: attempts stop once the caller's deadline has passed and backoff
+  never sleeps past it.
+Counters (model.retries, model.hedges, ...) are exported through services.metrics.
+"""
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait, TimeoutError as FutureTimeoutError
+import httpx
+import openai
+from flask import current_app
+from services import metrics
+from services.redis_client import get_redis
+
+# Errors worth another attempt: network problems, timeouts, 429 and 5xx
+TRANSIENT_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    httpx.TransportError,
+)
+
+CIRCUIT_KEY_PREFIX = 'circuit:'
+# Hedging needs this many recent latencies before trusting the percentile
+MIN_LATENCY_SAMPLES = 20
+# Seconds a document waits before another try when no call slot was free
+IN_FLIGHT_RETRY_AFTER = 5
+
+# Delete the probe lease only if we still own it
+RELEASE_PROBE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class CircuitOpenError(Exception):
+    """The provider is failing: the call was not attempted"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class InFlightLimitError(CircuitOpenError):
+    """Every model call slot of this process stayed busy: the call was not attempted"""
+
+    def __init__(self, retry_after):
+        Exception.__init__(self, f"Too many model calls in flight, retry in {retry_after}s")
+        self.name = 'in_flight'
+        self.retry_after = retry_after
+
+
+def is_transient(error):
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+# --- Circuit breaker (Redis, shared by the API and every worker) ---
+class CircuitBreaker:
+    """
+    Keys: circuit:<name>:failures (counter expiring after the window),
+    circuit:<name>:open (present while open, TTL = cooldown),
+    circuit:<name>:trial (half-open marker: one failure re-opens at once) and
+    circuit:<name>:probe (half-open: lease of the single call let through).
+    Redis errors never block calls (fail open).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.prefix = f"{CIRCUIT_KEY_PREFIX}{name}:"
+        self.probe_token = None  # set while this breaker holds the probe lease
+
+    def _config(self):
+        config = current_app.config
+        return (config.get('CIRCUIT_FAILURE_THRESHOLD', 5),
+                config.get('CIRCUIT_FAILURE_WINDOW', 60),
+                config.get('CIRCUIT_COOLDOWN', 30))
+
+    def check(self):
+        """Raises CircuitOpenError while the circuit is open, or half-open with a probe in flight"""
+        if self.probe_token:
+            return  # Our own retry while probing
+        try:
+            r = get_redis()
+            ttl = r.ttl(self.prefix + 'open')
+            if not (ttl and ttl > 0) and r.exists(self.prefix + 'trial'):
+                # Half-open: only the caller that takes the lease gets through
+                lease = current_app.config.get('CIRCUIT_PROBE_LEASE', 60)
+                token = uuid.uuid4().hex
+                if r.set(self.prefix + 'probe', token, nx=True, ex=lease):
+                    self.probe_token = token
+                    metrics.incr(f"model.circuit.{self.name}.probes")
+                    return
+                ttl = r.ttl(self.prefix + 'probe')
+                ttl = ttl if ttl and ttl > 0 else 1
+        except Exception as e:
+            print(f"⚠ Circuit breaker check failed (allowing the call): {e}")
+            return
+        if ttl and ttl > 0:
+            metrics.incr(f"model.circuit.{self.name}.rejected")
+            raise CircuitOpenError(self.name, ttl)
+
+    def release_probe(self):
+        """Gives the probe lease back without a verdict (e.g. a non-transient error)"""
+        if not self.probe_token:
+            return
+        try:
+            get_redis().eval(RELEASE_PROBE_SCRIPT, 1, self.prefix + 'probe', self.probe_token)
+        except Exception as e:
+            print(f"⚠ Circuit breaker update failed: {e}")
+        self.probe_token = None
+
+    def record_success(self):
+        try:
+            get_redis().delete(self.prefix + 'failures', self.prefix + 'trial', self.prefix + 'probe')
+        except Exception as e:
+            print(f"⚠ Circuit breaker update failed: {e}")
+        self.probe_token = None
+
+    def record_failure(self):
+        threshold, window, cooldown = self._config()
+        try:
+            r = get_redis()
+            pipe = r.pipeline()
+            pipe.incr(self.prefix + 'failures')
+            pipe.exists(self.prefix + 'trial')
+            failures, in_trial = pipe.execute()
+            if failures == 1:
+                # First failure starts the window
+                r.expire(self.prefix + 'failures', window)
+            if failures >= threshold or in_trial:
+                pipe = r.pipeline()
+                pipe.set(self.prefix + 'open', 1, ex=cooldown)
+                # After the cooldown the next failure re-opens immediately
+                pipe.set(self.prefix + 'trial', 1, ex=cooldown + window)
+                pipe.delete(self.prefix + 'failures', self.prefix + 'probe')
+                pipe.execute()
+                self.probe_token = None
+                metrics.incr(f"model.circuit.{self.name}.opened")
+                print(f"🔌 Circuit '{self.name}' opened for {cooldown}s after {failures} transient failures")
+        except Exception as e:
+            print(f"⚠ Circuit breaker update failed: {e}")
+
+    def state(self):
+        r = get_redis()
+        if r.exists(self.prefix + 'open'):
+            return 'open'
+        if r.exists(self.prefix + 'trial'):
+            return 'half_open'
+        return 'closed'
+
+
+# --- Latency tracking for the hedge delay (per process, per endpoint) ---
+# A fast tier's samples must not set the hedge delay of a slow one (and vice versa)
+_latencies = {}
+_latencies_lock = threading.Lock()
+
+
+def record_latency(seconds, name='openai'):
+    with _latencies_lock:
+        _latencies.setdefault(name, deque(maxlen=200)).append(seconds)
+
+
+def hedge_delay(name='openai'):
+    """Seconds to wait before hedging calls to an endpoint, or None when hedging is disabled"""
+    config = current_app.config
+    if not config.get('MODEL_HEDGE_ENABLED', True):
+        return None
+    with _latencies_lock:
+        samples = sorted(_latencies.get(name, ()))
+    if len(samples) < MIN_LATENCY_SAMPLES:
+        return config.get('MODEL_HEDGE_AFTER', 30.0)
+    percentile = config.get('MODEL_HEDGE_PERCENTILE', 95)
+    index = min(int(len(samples) * percentile / 100), len(samples) - 1)
+    return max(samples[index], config.get('MODEL_HEDGE_MIN_DELAY', 5.0))
+
+
+# --- In-flight bound (per process) ---
+_call_slots = None
+_call_slots_lock = threading.Lock()
+
+
+def _get_call_slots():
+    global _call_slots
+    if _call_slots is None:
+        with _call_slots_lock:
+            if _call_slots is None:
+                _call_slots = threading.BoundedSemaphore(current_app.config.get('EXTRACTION_MAX_IN_FLIGHT', 40))
+    return _call_slots
+
+
+def _take_call_slot(deadline):
+    """Waits for a free call slot (backpressure) or raises InFlightLimitError"""
+    wait_for = current_app.config.get('MODEL_ROUTER_WAIT_TIMEOUT', 30.0)
+    if deadline is not None:
+        wait_for = min(wait_for, max(deadline - time.monotonic(), 0))
+    if not _get_call_slots().acquire(timeout=wait_for):
+        metrics.incr('model.in_flight_rejected')
+        raise InFlightLimitError(IN_FLIGHT_RETRY_AFTER)
+
+
+def _slotted(fn):
+    """fn holding a call slot taken beforehand, given back when it returns (even as a losing hedge)"""
+    def _call():
+        try:
+            return fn()
+        finally:
+            _get_call_slots().release()
+    return _call
+
+
+def _backoff(attempt):
+    config = current_app.config
+    cap = min(config.get('MODEL_RETRY_MAX_DELAY', 20.0), config.get('MODEL_RETRY_BASE_DELAY', 1.0) * 2 ** attempt)
+    return random.uniform(0, cap)  # full jitter: retries of many workers don't align
+
+
+# --- Sync path ---
+_hedge_pool = None
+_hedge_pool_slots = None  # free pool threads: work is only submitted to a free one, never queued
+_hedge_pool_lock = threading.Lock()
+
+
+def _get_hedge_pool():
+    """The process-wide pool and its free-thread semaphore (2 threads per worker thread by default)"""
+    global _hedge_pool, _hedge_pool_slots
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                config = current_app.config
+                size = config.get('MODEL_HEDGE_POOL_SIZE') or 2 * config.get('CELERY_WORKER_CONCURRENCY', 1)
+                _hedge_pool_slots = threading.BoundedSemaphore(size)
+                _hedge_pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix='model-hedge')
+    return _hedge_pool, _hedge_pool_slots
+
+
+def _hedged(fn, hedge_allowed=None, name='openai'):
+    """
+    Runs fn with the call slot taken by the caller; a hedge takes its own.
+    A sync HTTP request cannot be interrupted, so for a hedge to be able to
+    win the first attempt runs on a pool thread too; without a free pool
+    thread (or with hedging disabled) it runs on the calling thread, unhedged.
+    """
+    delay = hedge_delay(name)
+    if delay is None:
+        return _slotted(fn)()
+
+    pool, pool_slots = _get_hedge_pool()
+    if not pool_slots.acquire(blocking=False):
+        # Pool saturated: never queue behind other calls (the wait would count as latency)
+        metrics.incr('model.hedge_pool_full')
+        return _slotted(fn)()
+
+    app = current_app._get_current_object()
+
+    def _run(call):
+        try:
+            with app.app_context():
+                return call()
+        finally:
+            pool_slots.release()
+
+    first = pool.submit(_run, _slotted(fn))
+    try:
+        return first.result(timeout=delay)
+    except FutureTimeoutError:
+        pass
+
+    if not pool_slots.acquire(blocking=False):
+        metrics.incr('model.hedge_pool_full')
+        return first.result()
+    if not _get_call_slots().acquire(blocking=False):
+        # Every call slot is busy: a hedge would only add load
+        pool_slots.release()
+        metrics.incr('model.hedges_skipped')
+        return first.result()
+    if hedge_allowed is not None and not hedge_allowed():
+        # No free budget for a second request (e.g. throttled): keep waiting on the first
+        _get_call_slots().release()
+        pool_slots.release()
+        metrics.incr('model.hedges_skipped')
+        return first.result()
+
+    # Slower than the recent p95: race a second identical request
+    metrics.incr('model.hedges')
+    second = pool.submit(_run, _slotted(fn))
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    metrics.incr('model.hedge_wins')
+                # The loser cannot be interrupted (sync HTTP): its result is dropped
+                # and its request ends at the caller's deadline at the latest
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def call_with_resilience(fn, breaker_name='openai', max_attempts=None, before_attempt=None, hedge_allowed=None,
+                         deadline=None):
+    """
+    Calls fn() (one model request) with circuit breaker, hedging and retries.
+    breaker_name names the endpoint: its circuit and its latency samples.
+    before_attempt() runs before each attempt's timer starts (e.g. waiting for
+    rate-limit budget), so its wait never triggers a hedge or counts as
+    latency; hedge_allowed() is asked before sending a hedge.
+    deadline (time.monotonic()) ends the retries; fn should cut its own
+    request timeout to it.
+    Raises CircuitOpenError (InFlightLimitError when no call slot got free),
+    TimeoutError past the deadline, or the last error once retries are exhausted.
+    """
+    breaker = CircuitBreaker(breaker_name)
+    max_attempts = max_attempts or current_app.config.get('MODEL_RETRY_MAX_ATTEMPTS', 3)
+    for attempt in range(max_attempts):
+        if deadline is not None and time.monotonic() >= deadline:
+            metrics.incr('model.deadline_exceeded')
+            raise TimeoutError('Model call deadline exceeded')
+        breaker.check()
+        if before_attempt is not None:
+            before_attempt()
+        _take_call_slot(deadline)
+        started = time.monotonic()
+        try:
+            result = _hedged(fn, hedge_allowed, breaker_name)
+        except Exception as e:
+            if not is_transient(e):
+                breaker.release_probe()
+                raise
+            metrics.incr('model.transient_errors')
+            breaker.record_failure()
+            if attempt + 1 >= max_attempts:
+                raise
+            delay = _backoff(attempt)
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.monotonic(), 0))
+            metrics.incr('model.retries')
+            print(f"🔁 Transient model error ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        record_latency(time.monotonic() - started, breaker_name)
+        breaker.record_success()
+        return result
@@ -0,0 +1,93 @@
+# backend/services/staged_upload.py
+"""
+Staged (non-blocking) uploads.
+With UPLOAD_MODE=staged the API only spools the multipart files to local disk,
+saves the Document as 'staged' and answers 202; the Celery task
+push_staged_upload then normalizes the images, pushes them to storage
+(Cloudinary by default) and queues the extraction. The spool folder must be reachable by the API and the workers
+(same host or a shared volume, see docker-compose.yml).
+"""
+import os
+import uuid
+from flask import current_app
+from werkzeug.utils import secure_filename
+from services.storage import get_storage
+from services.image_processor import normalize_image
+from services.inline_images import remember_uploads
+
+
+def is_staged_mode():
+    return current_app.config.get('UPLOAD_MODE', 'sync') == 'staged'
+
+
+def spool_upload(file):
+    """Streams an uploaded file to the spool folder and returns its path"""
+    folder = current_app.config['UPLOAD_SPOOL_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    filename = secure_filename(file.filename or '') or 'upload'
+    path = os.path.join(folder, f"{uuid.uuid4().hex}_{filename}")
+    # FileStorage.save copies in fixed-size chunks, never the whole body in memory
+    file.save(path)
+    return path
+
+
+def remove_spooled(*paths):
+    for path in paths:
+        if not path:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠ Failed to remove spooled upload {path}: {e}")
+
+
+def push_staged_document(document):
+    """
+    Normalizes the spooled recto/verso of a staged document, writes them to
+    the storage backend, stores the URLs and moves the document to 'pending'.
+    Returns False if an upload failed (document marked failed) or the
+    document was no longer staged.
+    """
+    folder = f"uploads/{document.user.id}/{document.document_type}"
+    paths = [document.staged_path_recto, document.staged_path_verso]
+    sources = [open(path, 'rb') if path else None for path in paths]
+    try:
+        # Image normalization runs here, off the request thread
+        normalized = [
+            normalize_image(source, os.path.basename(path)) if source else None
+            for source, path in zip(sources, paths)
+        ]
+        # All-or-nothing (and parallel on Cloudinary)
+        urls = get_storage().save_many([n.stream if n else None for n in normalized], folder=folder)
+        if urls:
+            # Inline mode: keep the bytes so the model needn't fetch the URLs
+            remember_uploads(urls, normalized)
+    finally:
+        for source in sources:
+            if source:
+                source.close()
+        # Also on errors: the task marks the document failed, the files are never retried
+        remove_spooled(*paths)
+
+    if not urls:
+        document.update_status('failed', 'Failed to store the staged files.', expected=['staged'],
+                               staged_path_recto=None, staged_path_verso=None)
+        return False
+
+    url_recto, url_verso = urls
+    normalized_recto, normalized_verso = normalized
+    # One atomic update: URLs, sizes and staged -> pending (a duplicate push loses the race)
+    return document.update_status(
+        'pending',
+        expected=['staged'],
+        image_path_recto=url_recto,
+        image_path_verso=url_verso,
+        original_size_recto=normalized_recto.original_size,
+        stored_size_recto=normalized_recto.stored_size,
+        original_size_verso=normalized_verso.original_size if normalized_verso else None,
+        stored_size_verso=normalized_verso.stored_size if normalized_verso else None,
+        staged_path_recto=None,
+        staged_path_verso=None,
+    )
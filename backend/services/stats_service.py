@@ -0,0 +1,121 @@
+# backend/services/stats_service.py
+"""
+Admin dashboard statistics.
+Counts per type/status come from a single $facet aggregation, or, when
+ADMIN_STATS_MATERIALIZED is enabled, from a materialized counters document in
+the `stats` collection that is kept up to date incrementally ($inc) on
+document create / delete / status change, so reads are O(1). Bulk
+QuerySet deletes rebuild the counters from the aggregation.
+"""
+from datetime import datetime
+from flask import current_app
+from mongoengine.connection import get_db
+
+STATS_COLLECTION = 'stats'
+DOCUMENT_STATS_ID = 'documents'
+DOCUMENT_TYPES = ['cin', 'driving_license', 'vehicle_registration']
+DOCUMENT_STATUSES = ['staged', 'pending', 'processing', 'completed', 'failed', 'confirmed']
+
+
+def _stats_collection():
+    return get_db()[STATS_COLLECTION]
+
+
+def _is_materialized():
+    try:
+        return current_app.config.get('ADMIN_STATS_MATERIALIZED', False)
+    except RuntimeError:
+        # Outside an app context (e.g. a script): fall back to aggregation only
+        return False
+
+
+def aggregate_document_stats():
+    """Counts documents by type and status with one $facet aggregation"""
+    pipeline = [
+        {'$facet': {
+            'total': [{'$count': 'count'}],
+            'by_type': [{'$group': {'_id': '$document_type', 'count': {'$sum': 1}}}],
+            'by_status': [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}],
+        }}
+    ]
+    result = next(get_db()['documents'].aggregate(pipeline), {})
+
+    total = result.get('total', [])
+    by_type = {doc_type: 0 for doc_type in DOCUMENT_TYPES}
+    by_type.update({row['_id']: row['count'] for row in result.get('by_type', []) if row['_id']})
+    by_status = {status: 0 for status in DOCUMENT_STATUSES}
+    by_status.update({row['_id']: row['count'] for row in result.get('by_status', []) if row['_id']})
+
+    return {
+        'total': total[0]['count'] if total else 0,
+        'by_type': by_type,
+        'by_status': by_status,
+    }
+
+
+def rebuild_materialized_stats():
+    """Recomputes the counters document from scratch (initial seed or repair)"""
+    stats = aggregate_document_stats()
+    _stats_collection().replace_one(
+        {'_id': DOCUMENT_STATS_ID},
+        {**stats, 'rebuilt_at': datetime.utcnow()},
+        upsert=True
+    )
+    return stats
+
+
+def get_document_stats():
+    """Document counters for the admin dashboard"""
+    if not _is_materialized():
+        return aggregate_document_stats()
+
+    stats = _stats_collection().find_one({'_id': DOCUMENT_STATS_ID})
+    if stats is None:
+        return rebuild_materialized_stats()
+
+    return {
+        'total': stats.get('total', 0),
+        'by_type': {doc_type: stats.get('by_type', {}).get(doc_type, 0) for doc_type in DOCUMENT_TYPES},
+        'by_status': {status: stats.get('by_status', {}).get(status, 0) for status in DOCUMENT_STATUSES},
+    }
+
+
+def _apply(increments):
+    """
+    Applies $inc to the counters document. Nothing is created (no upsert):
+    a missing document is rebuilt from the aggregation on the next read.
+    Counters must never break a document write, so errors are only logged.
+    """
+    if not _is_materialized():
+        return
+    try:
+        _stats_collection().update_one({'_id': DOCUMENT_STATS_ID}, {'$inc': increments})
+    except Exception as e:
+        print(f"⚠ Failed to update materialized stats: {e}")
+
+
+def record_document_created(document_type, status):
+    _apply({'total': 1, f'by_type.{document_type}': 1, f'by_status.{status}': 1})
+
+
+def record_document_deleted(document_type, status):
+    _apply({'total': -1, f'by_type.{document_type}': -1, f'by_status.{status}': -1})
+
+
+def record_documents_bulk_deleted():
+    """QuerySet deletes don't know what they removed: recount from the collection"""
+    if not _is_materialized():
+        return
+    try:
+        rebuild_materialized_stats()
+    except Exception as e:
+        print(f"⚠ Failed to rebuild materialized stats: {e}")
+
+
+def record_status_change(old_status, new_status, count=1):
+    if old_status == new_status or not count:
+        return
+    increments = {f'by_status.{new_status}': count}
+    if old_status:
+        increments[f'by_status.{old_status}'] = -count
+    _apply(increments)
@@ -0,0 +1,77 @@
+# backend/services/status_events.py
+"""
+Document status change notifications over Redis pub/sub.
+Document.update_status publishes every transition on a per-document channel;
+the SSE endpoint subscribes to it so clients are told once, when the status
+changes, instead of polling GET /api/documents/<id>.
+An open stream holds its server worker while idle, so full streams are only
+served by a green (eventlet) server, the backend-events process. On a
+threaded server the endpoint is a short long-poll instead: it returns on the
+first status change or after STATUS_LONG_POLL_TIMEOUT, and the client
+reconnects.
+"""
+import json
+import time
+from services.redis_client import get_redis
+
+CHANNEL_PREFIX = 'document_status:'
+TERMINAL_STATUSES = ('completed', 'failed', 'confirmed')
+
+
+def publish_status_change(document_id, status):
+    """Publishes a status change (errors are logged, never raised)"""
+    try:
+        message = json.dumps({'id': str(document_id), 'status': status})
+        get_redis().publish(CHANNEL_PREFIX + str(document_id), message)
+    except Exception as e:
+        print(f"⚠ Failed to publish status for document {document_id}: {e}")
+
+
+def is_green_server():
+    """True under an eventlet worker (gunicorn -k eventlet), where idle streams cost no thread"""
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('socket')
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_status_events(redis_client, document_id, load_status, timeout=60, heartbeat=15,
+                         until_change=False):
+    """
+    Generator of Server-Sent Events for one document.
+    Subscribes first, then sends the current status (load_status()) so no
+    transition can be missed in between. Ends on a terminal status, or with a
+    'timeout' event after `timeout` seconds so the client reconnects.
+    until_change: also end after the first transition (long-poll).
+    """
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(CHANNEL_PREFIX + str(document_id))
+    try:
+        status = load_status()
+        yield _sse_event('status', {'id': str(document_id), 'status': status})
+        if status in TERMINAL_STATUSES:
+            return
+
+        deadline = time.monotonic() + timeout
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=1.0)
+            if message and message.get('type') == 'message':
+                data = json.loads(message['data'])
+                yield _sse_event('status', data)
+                last_sent = time.monotonic()
+                if until_change or data.get('status') in TERMINAL_STATUSES:
+                    return
+            elif time.monotonic() - last_sent >= heartbeat:
+                # Comment line: keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+
+        yield _sse_event('timeout', {'id': str(document_id)})
+    finally:
+        pubsub.close()
@@ -0,0 +1,215 @@
+# backend/services/storage.py
+"""
+Pluggable image storage used by uploads (sync and staged).
+STORAGE_BACKEND selects the implementation:
+- 'cloudinary' (default): the existing Cloudinary uploader
+- 'local': content-addressed files under STORAGE_LOCAL_ROOT, served by
+  GET /api/files/<key> to holders of a signed, time-limited URL
+  (signed_url). Identical files are stored once. Needs no network, so
+  uploads can be benchmarked and load tested offline.
+Both backends take file-like objects and return URLs, so create_document and
+run_ai_extraction don't depend on the backend.
+"""
+import hashlib
+import hmac
+import os
+import re
+import tempfile
+import threading
+import time
+from flask import current_app
+from services.cloudinary_service import upload_many_to_cloudinary
+
+CHUNK_SIZE = 1024 * 1024
+FILES_URL_PATH = '/api/files/'
+KEY_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]{1,5}$')
+
+# Magic bytes -> extension, for streams that carry no filename (normalized images)
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF8', 'gif'),
+    (b'BM', 'bmp'),
+    (b'II*\x00', 'tif'),
+    (b'MM\x00*', 'tif'),
+)
+
+
+def _sniff_extension(head, filename=None):
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for signature, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    extension = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    return extension if re.fullmatch(r'[a-z0-9]{1,5}', extension) else 'bin'
+
+
+class CloudinaryStorage:
+    """Cloudinary backend (the historical behaviour)"""
+
+    name = 'cloudinary'
+
+    def save_many(self, files, folder):
+        return upload_many_to_cloudinary(files, folder=folder)
+
+    def read_bytes(self, url, max_bytes):
+        # Bytes only live in Cloudinary: the model fetches the URL
+        return None
+
+    def signed_url(self, url, ttl=None):
+        # Cloudinary delivery URLs are public
+        return url
+
+    def configuration_error(self):
+        config = current_app.config
+        if not config.get('CLOUDINARY_CLOUD_NAME') or not config.get('CLOUDINARY_API_KEY') \
+                or not config.get('CLOUDINARY_API_SECRET'):
+            return ('Cloudinary is not configured. Please check environment variables: '
+                    'CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET')
+        return None
+
+
+class LocalStorage:
+    """
+    Content-addressed local storage: <root>/<aa>/<bb>/<sha256>.<ext>.
+    Writes stream to a temporary file while hashing, then rename into place
+    (or discard it when the object already exists: deduplication).
+    Objects may be shared by several documents, so they are never deleted
+    here (an object left by a failed upload is reused by the next identical one).
+    """
+
+    name = 'local'
+
+    def __init__(self, root, public_base_url):
+        self.root = root
+        self.public_base_url = public_base_url.rstrip('/')
+        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+
+    def path_for(self, key):
+        if not KEY_PATTERN.match(key):
+            return None
+        return os.path.join(self.root, key)
+
+    def url_for(self, key):
+        return f"{self.public_base_url}{FILES_URL_PATH}{key}"
+
+    def key_for_url(self, url):
+        prefix = f"{self.public_base_url}{FILES_URL_PATH}"
+        if not url or not url.startswith(prefix):
+            return None
+        key = url[len(prefix):]
+        return key if KEY_PATTERN.match(key) else None
+
+    def _write_temp(self, file):
+        """Copies the stream into a temporary file, returning (temp_path, sha256, head)"""
+        digest = hashlib.sha256()
+        handle, temp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        head = b''
+        try:
+            file.seek(0)
+            with os.fdopen(handle, 'wb') as target:
+                for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                    if not head:
+                        head = chunk[:16]
+                    digest.update(chunk)
+                    target.write(chunk)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return temp_path, digest.hexdigest(), head
+
+    def save(self, file):
+        """Stores one file; returns (url, created) - created is False for a duplicate"""
+        temp_path, sha256, head = self._write_temp(file)
+        extension = _sniff_extension(head, getattr(file, 'filename', None))
+        key = f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{extension}"
+        path = os.path.join(self.root, key)
+
+        if os.path.exists(path):
+            os.remove(temp_path)
+            return self.url_for(key), False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)  # Atomic: readers never see a partial object
+        return self.url_for(key), True
+
+    def save_many(self, files, folder):
+        # Content addressing makes the folder irrelevant (and deduplicates across users)
+        urls = []
+        try:
+            for file in files:
+                urls.append(self.save(file)[0] if file is not None else None)
+        except Exception as e:
+            # All-or-nothing for the caller, like the Cloudinary backend. Objects
+            # already written stay: a concurrent identical upload may use them.
+            print(f"❌ Local storage write failed: {e}")
+            return None
+        return urls
+
+    def _signature(self, key, expires):
+        secret = current_app.config['SECRET_KEY'].encode('utf-8')
+        return hmac.new(secret, f"{key}:{expires}".encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def signed_url(self, url, ttl=None):
+        """Time-limited URL of a stored object (GET /api/files checks it)"""
+        key = self.key_for_url(url)
+        if not key:
+            return url
+        ttl = ttl or current_app.config.get('STORAGE_SIGNED_URL_TTL', 3600)
+        # Rounded up to the TTL so a URL stays the same (cacheable) for a while
+        expires = (int(time.time()) // ttl + 2) * ttl
+        return f"{url}?expires={expires}&signature={self._signature(key, expires)}"
+
+    def verify_signature(self, key, expires, signature):
+        """True for a signature made by signed_url that has not expired"""
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return False
+        if expires < time.time() or not signature:
+            return False
+        return hmac.compare_digest(self._signature(key, expires), signature)
+
+    def read_bytes(self, url, max_bytes):
+        """Bytes of a stored object (None if unknown or larger than max_bytes)"""
+        key = self.key_for_url(url)
+        if not key:
+            return None
+        path = os.path.join(self.root, key)
+        try:
+            if os.path.getsize(path) > max_bytes:
+                return None
+            with open(path, 'rb') as stored:
+                return stored.read()
+        except OSError:
+            return None
+
+    def configuration_error(self):
+        return None
+
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage():
+    """Returns the configured storage backend (one instance per configuration)"""
+    config = current_app.config
+    backend = config.get('STORAGE_BACKEND', 'cloudinary')
+    if backend == 'local':
+        cache_key = (backend, config['STORAGE_LOCAL_ROOT'], config['STORAGE_PUBLIC_BASE_URL'])
+    else:
+        cache_key = (backend,)
+
+    storage = _storages.get(cache_key)
+    if storage is None:
+        with _storages_lock:
+            storage = _storages.get(cache_key)
+            if storage is None:
+                if backend == 'local':
+                    storage = LocalStorage(config['STORAGE_LOCAL_ROOT'], config['STORAGE_PUBLIC_BASE_URL'])
+                else:
+                    storage = CloudinaryStorage()
+                _storages[cache_key] = storage
+    return storage
@@ -0,0 +1,124 @@
+# backend/services/user_cache.py
+"""
+Cache of the user fields the auth decorators need (identity, role, is_active).
+A short-TTL in-process LRU answers most requests without touching Mongo; an
+optional Redis tier shares entries between gunicorn workers. User.save() and
+User.delete() invalidate both tiers, so password, role or activation changes
+apply immediately in the local process and at most USER_CACHE_TTL seconds
+later in the others.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from bson import ObjectId
+from flask import current_app
+from services.redis_client import get_redis
+
+REDIS_KEY_PREFIX = 'user_cache:'
+# password_hash is deliberately not cached: nothing behind the decorators needs it
+CACHED_FIELDS = ('username', 'email', 'name', 'role', 'is_active')
+
+_local = OrderedDict()  # user_id -> (expires_at, fields)
+_lock = threading.Lock()
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        # Outside an app context (e.g. a script): local tier only, with defaults
+        return default
+
+
+def _local_get(user_id):
+    with _lock:
+        entry = _local.get(user_id)
+        if entry is None:
+            return None
+        expires_at, fields = entry
+        if expires_at < time.monotonic():
+            del _local[user_id]
+            return None
+        _local.move_to_end(user_id)
+        return fields
+
+
+def _local_set(user_id, fields):
+    ttl = _config('USER_CACHE_TTL', 30)
+    max_entries = _config('USER_CACHE_MAX_ENTRIES', 10000)
+    with _lock:
+        _local[user_id] = (time.monotonic() + ttl, fields)
+        _local.move_to_end(user_id)
+        while len(_local) > max_entries:
+            _local.popitem(last=False)
+
+
+def _redis_get(user_id):
+    if not _config('USER_CACHE_REDIS_ENABLED', False):
+        return None
+    try:
+        raw = get_redis().get(REDIS_KEY_PREFIX + user_id)
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        print(f"⚠ User cache: Redis read failed for {user_id}: {e}")
+        return None
+
+
+def _redis_set(user_id, fields):
+    if not _config('USER_CACHE_REDIS_ENABLED', False):
+        return
+    try:
+        get_redis().set(REDIS_KEY_PREFIX + user_id, json.dumps(fields),
+                        ex=_config('USER_CACHE_REDIS_TTL', 300))
+    except Exception as e:
+        print(f"⚠ User cache: Redis write failed for {user_id}: {e}")
+
+
+def _load_fields(user_id):
+    # Imported here: models.user imports this module to invalidate on save
+    from models.user import User
+    user = User.objects(id=user_id).only(*CACHED_FIELDS).first()
+    if not user:
+        return None
+    return {field: getattr(user, field) for field in CACHED_FIELDS}
+
+
+def get_cached_user(user_id):
+    """
+    Returns a User carrying only id + CACHED_FIELDS, or None if the user
+    does not exist. The instance is read-only in practice: it has no
+    password_hash, so it must not be saved.
+    """
+    from models.user import User
+    user_id = str(user_id)
+
+    if not _config('USER_CACHE_ENABLED', True):
+        fields = _load_fields(user_id)
+    else:
+        fields = _local_get(user_id)
+        if fields is None:
+            fields = _redis_get(user_id)
+            if fields is None:
+                fields = _load_fields(user_id)
+                if fields is None:
+                    return None
+                _redis_set(user_id, fields)
+            _local_set(user_id, fields)
+
+    if fields is None:
+        return None
+    return User(id=ObjectId(user_id), **fields)
+
+
+def invalidate_user(user_id):
+    """Drops a user from both tiers (errors are logged, never raised)"""
+    user_id = str(user_id)
+    with _lock:
+        _local.pop(user_id, None)
+    if not _config('USER_CACHE_REDIS_ENABLED', False):
+        return
+    try:
+        get_redis().delete(REDIS_KEY_PREFIX + user_id)
+    except Exception as e:
+        print(f"⚠ User cache: failed to invalidate {user_id}: {e}")
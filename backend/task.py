@@ -1,15 +1,35 @@
 # backend/task.py
-from worker import celery  # <-- Import from the new 'worker.py'
+from celery.signals import worker_ready
+from flask import current_app
+from worker import celery, flask_app  # <-- Import from the new 'worker.py'
 from models.document import Document
 # This file needs to exist: backend/services/ai_processor.py
-from services.ai_processor import structured_intelligence 
+from services.ai_processor import structured_intelligence
+from services.reextraction import run_batch
+from services.extraction_cache import build_cache_key, get_cached_extraction, store_extraction
+from services.staged_upload import push_staged_document
+from services.resilience import CircuitOpenError
+from services.extraction_queue import BULK, INTERACTIVE, enqueue_extraction, release_bulk_slot, refresh_bulk_slot, feed_bulk_queue
+from services import metrics
+from services.idempotency import ExtractionLock
+from datetime import datetime
 import os
 
-@celery.task(name='task.run_ai_extraction')
-def run_ai_extraction(document_id: str):
+@celery.task(name='task.run_ai_extraction', bind=True)
+def run_ai_extraction(self, document_id: str, lane: str = None):
     """
     Celery task to run AI extraction in the background.
+    lane is the queue it was sent to ('interactive' or 'bulk', see services/extraction_queue.py).
     """
+    # At most one extraction per document at a time (redeliveries, duplicate dispatches)
+    lock = ExtractionLock(document_id)
+    if not lock.acquire():
+        print(f"ℹ Document {document_id} is already being extracted: duplicate task skipped.")
+        if lane == BULK:
+            release_bulk_slot(document_id)
+        return
+
+    deferred = False
     try:
         print(f"🚀 Starting AI document for document ID: {document_id}")
         document = Document.objects.get(id=document_id)  # Changed from .first() to .get()
@@ -17,12 +37,23 @@ def run_ai_extraction(document_id: str):
             print(f"❌ Error: document {document_id} not found.")
             return
 
-        # Mark as processing as soon as the worker picks it up
-        if document.status != 'processing':
-            document.update_status('processing')
+        # Claim the document as soon as the worker picks it up; a duplicate
+        # delivery of the same task loses the compare-and-set and stops here
+        if not document.update_status('processing', expected=['pending']):
+            metrics.incr('dedup.extraction_not_pending')
+            print(f"ℹ Document {document_id} is {document.status}, not pending: skipped.")
+            return
 
         if not document.image_path_recto:
-            document.update_status('failed', 'Missing image_path_recto.')
+            document.update_status('failed', 'Missing image_path_recto.', expected=['processing'])
+            return
+
+        # Same scan already extracted with the same prompt/model: skip the model call
+        cache_key = build_cache_key(document)
+        cached_result = get_cached_extraction(cache_key)
+        if cached_result is not None:
+            document.update_status('completed', expected=['processing'], extracted_data=cached_result)
+            print(f"⚡ Cache hit: document {document_id} completed from extraction cache.")
             return
 
         # Call AI service with image URL and document type
@@ -35,19 +66,94 @@ def run_ai_extraction(document_id: str):
 
         if result_object:
             # Already normalized by the AI schema
-            document.extracted_data = result_object
-            document.update_status('completed')
+            if not document.update_status('completed', expected=['processing'], extracted_data=result_object):
+                print(f"⚠ Document {document_id} changed to {document.status} during extraction: result dropped.")
+                return
+            store_extraction(cache_key, result_object)
+            # Upload to result, per lane: interactive p95 must stay low whatever the bulk backlog
+            metrics.observe(f"extraction.time_to_completion.{lane or 'default'}",
+                            (datetime.utcnow() - document.created_at).total_seconds() * 1000)
             print(f"✅ Success: document {document_id} completed.")
         else:
-            document.update_status('failed', error_message="AI failed to extract data.")
+            document.update_status('failed', error_message="AI failed to extract data.", expected=['processing'])
             print(f"❌ Failed: AI could not process document {document_id}.")
     
+    except CircuitOpenError as e:
+        # Provider is failing: put the document back in the queue instead of
+        # failing it (and the rest of the backlog) right now
+        if self.request.retries >= current_app.config.get('CIRCUIT_MAX_DEFERRALS', 100):
+            document.update_status('failed', error_message=f"Model provider unavailable: {str(e)}", expected=['processing'])
+            return
+        document.update_status('pending', expected=['processing'])
+        print(f"⏸ {e}: document {document_id} deferred.")
+        deferred = True  # A deferred bulk document keeps its slot
+        if lane == BULK:
+            refresh_bulk_slot(document_id, e.retry_after)
+        raise self.retry(countdown=e.retry_after, max_retries=None)
+
     except Exception as e:
         print(f"❌ CRITICAL ERROR for document {document_id}: {str(e)}")
         # Try to update document status even if AI fails badly
         try:
             document = Document.objects.get(id=document_id)  # Changed from .first() to .get()
             if document:
-                document.update_status('failed', error_message=f"System error: {str(e)}")
+                # Never overwrite a result a duplicate delivery already stored
+                document.update_status('failed', error_message=f"System error: {str(e)}",
+                                       expected=['pending', 'processing'])
         except Exception as inner_e:
             print(f"❌ Error updating document status: {inner_e}")
+
+    finally:
+        lock.release()
+        if lane == BULK and not deferred:
+            release_bulk_slot(document_id)
+
+
+@celery.task(name='task.push_staged_upload')
+def push_staged_upload(document_id: str, lane: str = INTERACTIVE, tenant: str = None):
+    """
+    Celery task pushing the spooled files of a staged upload to Cloudinary,
+    then queueing the AI extraction in the lane chosen at upload time.
+    """
+    try:
+        document = Document.objects.get(id=document_id)
+        if document.status != 'staged':
+            print(f"ℹ Document {document_id} is {document.status}, nothing to push.")
+            return
+
+        if push_staged_document(document):
+            print(f"☁ Staged upload pushed for document {document_id}.")
+            enqueue_extraction(document_id, tenant or str(document.user.id), lane)
+        else:
+            print(f"❌ Failed: staged upload of document {document_id} could not be pushed.")
+
+    except Exception as e:
+        print(f"❌ CRITICAL ERROR pushing staged document {document_id}: {str(e)}")
+        try:
+            document = Document.objects.get(id=document_id)
+            document.update_status('failed', error_message=f"System error: {str(e)}", expected=['staged'])
+        except Exception as inner_e:
+            print(f"❌ Error updating document status: {inner_e}")
+
+
+@celery.task(name='task.run_reextraction_job')
+def run_reextraction_job(job_id: str, run_token: str):
+    """
+    Celery task enqueueing one chunk of a bulk re-extraction job (claimed with
+    start_run). The next chunk is scheduled as a new task with a countdown, so
+    no worker slot is held while the job waits for its rate limit.
+    """
+    try:
+        delay = run_batch(job_id, run_token)
+        if delay is not None:
+            run_reextraction_job.apply_async(args=[job_id, run_token], countdown=max(delay, 0))
+    except Exception as e:
+        print(f"❌ CRITICAL ERROR for re-extraction job {job_id}: {str(e)}")
+
+
+@worker_ready.connect
+def resume_bulk_queue(sender=None, **kwargs):
+    """Feed waiting bulk documents (e.g. slots freed while no worker was running)"""
+    with flask_app.app_context():
+        feed_bulk_queue()
+
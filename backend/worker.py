@@ -1,4 +1,5 @@
 from celery import Celery
+from kombu import Queue
 import os
 import dotenv
 from flask import Flask
@@ -119,5 +120,12 @@ celery.conf.update(
     accept_content=['json'],
     result_serializer='json',
     task_force_execv=True,  # Critical for Windows compatibility
-    worker_pool='solo'      # Use solo pool on Windows instead of prefork
+    # 'threads' (default) runs CELERY_WORKER_CONCURRENCY documents per process, 'solo' on Windows
+    worker_pool=flask_app.config.get('CELERY_WORKER_POOL', 'threads'),
+    worker_concurrency=flask_app.config.get('CELERY_WORKER_CONCURRENCY', 32),
+    worker_prefetch_multiplier=1,
+    # Workers started without -Q consume all three; a dedicated
+    # `-Q interactive` worker keeps single uploads fast during bulk backlogs
+    task_default_queue='celery',
+    task_queues=(Queue('interactive'), Queue('celery'), Queue('bulk')),
 )
@@ -106,9 +106,29 @@ const AdminDashboardPage = () => {
     setDocumentToDelete(null);
   };
 
+  // List entries use the summary view: fetch the full document before opening it
+  const loadFullDocument = async (document: Document): Promise<Document | null> => {
+    if (document.view !== "summary") return document;
+    try {
+      return await adminService.getDocumentById(document.id);
+    } catch (error) {
+      console.error("Failed to load document:", error);
+      setNotification({ message: "Échec du chargement du document", type: "error" });
+      setTimeout(() => setNotification(null), 5000);
+      return null;
+    }
+  };
+
+  const handleView = async (document: Document) => {
+    const fullDocument = await loadFullDocument(document);
+    if (fullDocument) setSelectedDocument(fullDocument);
+  };
+
   const handleEdit = async (document: Document) => {
-    setSelectedDocument(document);
-    setEditData(document.extracted_data || {});
+    const fullDocument = await loadFullDocument(document);
+    if (!fullDocument) return;
+    setSelectedDocument(fullDocument);
+    setEditData(fullDocument.extracted_data || {});
     setIsEditing(true);
   };
 
@@ -461,7 +481,7 @@ const AdminDashboardPage = () => {
                     <td className="py-4 px-4">
                       <div className="flex gap-2">
                         <button
-                          onClick={() => setSelectedDocument(doc)}
+                          onClick={() => handleView(doc)}
                           className="p-2.5 bg-cyan-500 hover:bg-cyan-600 text-white rounded-lg transition-all duration-300 hover:scale-110 shadow-md hover:shadow-lg"
                           title="View"
                         >
@@ -540,7 +560,7 @@ const AdminDashboardPage = () => {
                 </div>
                 <div className="flex gap-2 pt-3 border-t border-gray-100">
                   <button
-                    onClick={() => setSelectedDocument(doc)}
+                    onClick={() => handleView(doc)}
                     className="flex-1 px-3 py-2.5 bg-gradient-to-r from-cyan-500 to-cyan-600 hover:from-cyan-400 hover:to-cyan-500 text-white rounded-xl transition-all duration-300 shadow-lg hover:shadow-xl flex items-center justify-center gap-1.5"
                   >
                     <Eye className="w-4 h-4" />
@@ -78,9 +78,10 @@ const DashboardPage: React.FC = () => {
   // This state holds the data for the validation form
   const [editableData, setEditableData] = useState<any>(null);
 
-  const pollingIntervalRef = useRef<ReturnType<typeof setInterval> | null>(
-    null
-  );
+  // Closes the server-sent status stream of the document being processed
+  const statusStreamRef = useRef<(() => void) | null>(null);
+  // Same key for every attempt with the same files: double-clicks and retries create one document
+  const uploadKeyRef = useRef<string>(documentService.newIdempotencyKey());
 
   // File states - used for other document types
   const [uploadedFile, setUploadedFile] = useState<File | null>(null);
@@ -150,56 +151,59 @@ const DashboardPage: React.FC = () => {
     }
   };
 
-  // --- Polling Logic (Refactored to use the service) ---
-  const stopPolling = () => {
-    if (pollingIntervalRef.current) {
-      clearInterval(pollingIntervalRef.current);
-      pollingIntervalRef.current = null;
+  // --- Status Stream Logic (server push instead of polling) ---
+  const stopStatusStream = () => {
+    if (statusStreamRef.current) {
+      statusStreamRef.current();
+      statusStreamRef.current = null;
     }
   };
 
   useEffect(() => {
-    // Get the document ID from the API response
-    const documentId = uploadResult?.id || uploadResult?.document_id;
+    uploadKeyRef.current = documentService.newIdempotencyKey();
+  }, [selectedType, uploadedFile, uploadedFileRecto, uploadedFileVerso]);
+
+  const uploadDocumentId = uploadResult?.id || uploadResult?.document_id;
+  const isUploadInProgress =
+    uploadResult?.status === "staged" ||
+    uploadResult?.status === "pending" ||
+    uploadResult?.status === "processing";
 
-    if (
-      documentId &&
-      (uploadResult?.status === "pending" ||
-        uploadResult?.status === "processing")
-    ) {
-      // Start polling
-      pollingIntervalRef.current = setInterval(async () => {
-        try {
-          console.log(`Polling for document status: ${documentId}`);
-
-          // PRO: Call the service
-          const documentData = await documentService.getDocument(documentId);
-
-          if (
-            documentData.status === "completed" ||
-            documentData.status === "failed"
-          ) {
-            stopPolling();
-            setUploadResult(documentData); // Update with final data
-          } else if (documentData.status === "processing") {
-            // Update status if it changed from 'pending'
+  useEffect(() => {
+    if (uploadDocumentId && isUploadInProgress) {
+      // The backend pushes one event per status change
+      statusStreamRef.current = documentService.subscribeToDocumentStatus(
+        uploadDocumentId,
+        async (event) => {
+          if (event.status === "completed" || event.status === "failed") {
+            stopStatusStream();
+            try {
+              // Fetch the final data once
+              const documentData = await documentService.getDocument(uploadDocumentId);
+              setUploadResult(documentData);
+            } catch (err) {
+              setError(
+                (err as any).response?.data?.error ||
+                "Failed to check document status."
+              );
+            }
+          } else {
+            // Update status if it changed (staged -> pending -> processing)
             setUploadResult((prev) =>
-              prev ? { ...prev, status: "processing" } : null
+              prev && prev.status !== event.status ? { ...prev, status: event.status } : prev
             );
           }
-        } catch (err) {
-          setError(
-            (err as any).response?.data?.error ||
-            "Failed to check document status."
-          );
-          stopPolling();
+        },
+        (err) => {
+          console.error("Document status stream failed:", err);
+          setError("Failed to check document status.");
         }
-      }, 3000); // Poll every 3 seconds
+      );
     }
 
     // Cleanup function
-    return () => stopPolling();
-  }, [uploadResult?.status, uploadResult?.id, uploadResult?.document_id]);
+    return () => stopStatusStream();
+  }, [uploadDocumentId, isUploadInProgress]);
 
   // --- Validation Form Logic (Populates form on 'completed') ---
   useEffect(() => {
@@ -408,7 +412,7 @@ const DashboardPage: React.FC = () => {
     setUploadResult(null);
     setError("");
     setEditableData(null);
-    stopPolling();
+    stopStatusStream();
 
     // Reset file input values
     const fileInput = document.getElementById(
@@ -443,7 +447,7 @@ const DashboardPage: React.FC = () => {
     if (!selectedType) return;
     setIsUploading(true);
     setError("");
-    stopPolling();
+    stopStatusStream();
 
     const formData = new FormData();
     formData.append("document_type", selectedType);
@@ -472,7 +476,7 @@ const DashboardPage: React.FC = () => {
 
     try {
       // PRO: Call the service
-      const data = await documentService.uploadDocument(formData);
+      const data = await documentService.uploadDocument(formData, uploadKeyRef.current);
       setUploadResult(data);
     } catch (err: any) {
       console.error("Upload error:", err);
@@ -568,9 +572,29 @@ const DashboardPage: React.FC = () => {
     return "N/A";
   };
 
-  const handleEditDocument = (document: DocumentResult) => {
-    setSelectedDocument(document);
-    setEditDocumentData(document.extracted_data || {});
+  // List entries use the summary view: fetch the full document before opening it
+  const loadFullDocument = async (document: DocumentResult): Promise<DocumentResult | null> => {
+    if (document.view !== "summary") return document;
+    try {
+      return await documentService.getDocument(document.id);
+    } catch (error) {
+      console.error("Failed to load document:", error);
+      setNotification({ message: "Échec du chargement du document", type: "error" });
+      setTimeout(() => setNotification(null), 5000);
+      return null;
+    }
+  };
+
+  const handleViewDocument = async (document: DocumentResult) => {
+    const fullDocument = await loadFullDocument(document);
+    if (fullDocument) setSelectedDocument(fullDocument);
+  };
+
+  const handleEditDocument = async (document: DocumentResult) => {
+    const fullDocument = await loadFullDocument(document);
+    if (!fullDocument) return;
+    setSelectedDocument(fullDocument);
+    setEditDocumentData(fullDocument.extracted_data || {});
     setIsEditingDocument(true);
   };
 
@@ -975,8 +999,7 @@ const DashboardPage: React.FC = () => {
                 </div>
 
                 {/* CASE 2A: document is running */}
-                {(uploadResult.status === "pending" ||
-                  uploadResult.status === "processing") && (
+                {isUploadInProgress && (
                   <div className="bg-gradient-to-r from-blue-50 to-cyan-50 border-2 border-blue-200/50 rounded-2xl p-6 mb-6 text-center shadow-lg">
                     <div className="flex items-center justify-center gap-4">
                       <div className="w-12 h-12 bg-gradient-to-br from-blue-500 to-cyan-500 rounded-full flex items-center justify-center shadow-lg">
@@ -1273,7 +1296,7 @@ const DashboardPage: React.FC = () => {
                         <td className="py-5 px-6">
                           <div className="flex gap-2">
                             <button
-                              onClick={() => setSelectedDocument(doc)}
+                              onClick={() => handleViewDocument(doc)}
                               className="p-3 bg-gradient-to-r from-cyan-500 to-cyan-600 hover:from-cyan-400 hover:to-cyan-500 text-white rounded-xl transition-all duration-300 hover:scale-110 shadow-lg hover:shadow-xl"
                               title="Voir"
                             >
@@ -1365,7 +1388,7 @@ const DashboardPage: React.FC = () => {
                     </div>
                     <div className="flex gap-2 pt-3 border-t border-gray-100">
                       <button
-                        onClick={() => setSelectedDocument(doc)}
+                        onClick={() => handleViewDocument(doc)}
                         className="flex-1 px-3 py-2.5 bg-gradient-to-r from-cyan-500 to-cyan-600 hover:from-cyan-400 hover:to-cyan-500 text-white rounded-xl transition-all duration-300 shadow-lg hover:shadow-xl flex items-center justify-center gap-1.5"
                       >
                         <Eye className="w-4 h-4" />
@@ -21,6 +21,7 @@ export interface Document {
   created_at: string;
   updated_at: string;
   extracted_data?: any;
+  view?: "summary"; // List entries: extracted_data only has the name fields
 }
 
 /**
@@ -49,7 +50,7 @@ export const getAllDocuments = async (
   per_page: number;
   total_pages: number;
 }> => {
-  const params: any = { page, per_page: perPage };
+  const params: any = { page, per_page: perPage, view: "summary" };
   if (filters?.document_type) params.document_type = filters.document_type;
   if (filters?.status) params.status = filters.status;
   if (filters?.user_id) params.user_id = filters.user_id;
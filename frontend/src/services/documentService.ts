@@ -1,4 +1,5 @@
 import api from "./api";
+import { API_BASE_URL } from "../config/config";
 
 // This interface should match the backend response
 export interface DocumentResult {
@@ -14,6 +15,7 @@ export interface DocumentResult {
   completed_at?: string | null;
   extracted_data?: any;
   error_messages?: string[];
+  view?: "summary"; // List entries: extracted_data only has the name fields
   [key: string]: any;
 }
 
@@ -24,16 +26,28 @@ interface ConfirmResponse {
 
 /**
  * Uploads a document (FormData). Interceptor adds token.
+ * Retries with the same idempotencyKey return the document of the first request.
  */
 export const uploadDocument = async (
-  formData: FormData
+  formData: FormData,
+  idempotencyKey?: string
 ): Promise<DocumentResult> => {
   // The backend endpoint is /api/documents/upload
   // Don't set Content-Type manually - axios will set it automatically with boundary for FormData
-  const response = await api.post("/api/documents/upload", formData);
+  const response = await api.post("/api/documents/upload", formData, {
+    headers: idempotencyKey ? { "Idempotency-Key": idempotencyKey } : undefined,
+  });
   return response.data;
 };
 
+/**
+ * New Idempotency-Key for an upload (one per selected set of files).
+ */
+export const newIdempotencyKey = (): string =>
+  typeof crypto !== "undefined" && "randomUUID" in crypto
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
 /**
  * Fetches the status and data of a single document by its ID.
  */
@@ -45,6 +59,81 @@ export const getDocument = async (
   return response.data;
 };
 
+export interface DocumentStatusEvent {
+  id: string;
+  status: string;
+}
+
+const TERMINAL_STATUSES = ["completed", "failed", "confirmed"];
+
+/**
+ * Subscribes to a document's status changes (Server-Sent Events).
+ * Uses fetch instead of EventSource so the Authorization header can be sent,
+ * and reconnects after the server-side stream timeout until a terminal status.
+ * Returns a function that closes the stream.
+ */
+export const subscribeToDocumentStatus = (
+  documentId: string,
+  onStatus: (event: DocumentStatusEvent) => void,
+  onError: (error: Error) => void
+): (() => void) => {
+  const controller = new AbortController();
+
+  const connect = async () => {
+    while (!controller.signal.aborted) {
+      const token = localStorage.getItem("access_token");
+      const response = await fetch(
+        `${API_BASE_URL}/api/documents/${documentId}/events`,
+        {
+          headers: token ? { Authorization: `Bearer ${token}` } : {},
+          credentials: "include",
+          signal: controller.signal,
+        }
+      );
+      if (!response.ok || !response.body) {
+        throw new Error(`Status stream failed (${response.status})`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break; // Server timeout: reconnect
+        buffer += decoder.decode(value, { stream: true });
+
+        let separator = buffer.indexOf("\n\n");
+        while (separator !== -1) {
+          const rawEvent = buffer.slice(0, separator);
+          buffer = buffer.slice(separator + 2);
+          separator = buffer.indexOf("\n\n");
+
+          let eventName = "message";
+          let data = "";
+          for (const line of rawEvent.split("\n")) {
+            if (line.startsWith("event:")) eventName = line.slice(6).trim();
+            else if (line.startsWith("data:")) data += line.slice(5).trim();
+          }
+          if (eventName !== "status" || !data) continue;
+
+          const event: DocumentStatusEvent = JSON.parse(data);
+          onStatus(event);
+          if (TERMINAL_STATUSES.includes(event.status)) {
+            controller.abort();
+            return;
+          }
+        }
+      }
+    }
+  };
+
+  connect().catch((err) => {
+    if (!controller.signal.aborted) onError(err);
+  });
+
+  return () => controller.abort();
+};
+
 /**
  * Confirms the user-validated data.
  */
@@ -82,8 +171,9 @@ export const getUserDocuments = async (
   per_page: number;
   total_pages: number;
 }> => {
+  // Lists only need the summary view; open a document with getDocument
   const response = await api.get("/api/documents", {
-    params: { page, per_page: perPage },
+    params: { page, per_page: perPage, view: "summary" },
   });
   return response.data;
 };